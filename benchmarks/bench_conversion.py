@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark of the TTree <-> DataFrame conversion. Reports wall time and the additional peak RSS of
+the conversion for the former implementation (tree2array + pd.DataFrame, to_records + array2tree)
+and the current one. Every measurement runs in a fresh process.
+
+Usage: bench_conversion.py [n_rows] [n_columns]
+"""
+from __future__ import division, print_function
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+import numpy as np
+import pandas as pd
+
+
+def current_rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_tree_to_frame(tree):
+    from root_numpy import tree2array
+    return pd.DataFrame(tree2array(tree))
+
+
+def legacy_frame_to_tree(data_frame):
+    from root_numpy import array2tree
+    return array2tree(data_frame.to_records(index=False), name='bench')
+
+
+def current_tree_to_frame(tree):
+    from ekpytools.conversion import convert_ttree_to_data_frame
+    return convert_ttree_to_data_frame(tree)
+
+
+def current_frame_to_tree(data_frame):
+    from ekpytools.conversion import convert_data_frame_to_ttree
+    return convert_data_frame_to_ttree(data_frame, 'bench')
+
+
+def run_tree_to_frame(function, file_name, queue):
+    from ekpytools.datahandling import load_tree_from_file
+    tree, root_file = load_tree_from_file(file_name, 'bench')
+
+    rss_before = current_rss_mb()
+    start = time.time()
+    function(tree)
+    queue.put((time.time() - start, peak_rss_mb() - rss_before))
+
+
+def run_frame_to_tree(function, n_rows, n_columns, queue):
+    import ROOT
+    ROOT.gROOT.cd()
+    data_frame = pd.DataFrame(np.random.normal(size=(n_rows, n_columns)),
+                              columns=['var{}'.format(index) for index in range(n_columns)])
+
+    rss_before = current_rss_mb()
+    start = time.time()
+    function(data_frame)
+    queue.put((time.time() - start, peak_rss_mb() - rss_before))
+
+
+def measure(target, *args):
+    queue = Queue()
+    process = Process(target=target, args=args + (queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def write_tree(file_name, n_rows, n_columns, chunk_size=10**6):
+    from root_numpy import array2root
+
+    dtype = [('var{}'.format(index), 'f8') for index in range(n_columns)]
+    for start in range(0, n_rows, chunk_size):
+        array = np.empty(min(chunk_size, n_rows - start), dtype=dtype)
+        for name, _ in dtype:
+            array[name] = np.random.normal(size=array.size)
+        array2root(array, file_name, treename='bench', mode='recreate' if start == 0 else 'update')
+
+
+def main(n_rows=10**7, n_columns=50):
+    file_name = os.path.join(tempfile.mkdtemp(), 'bench.root')
+    write_tree(file_name, n_rows, n_columns)
+
+    print('{} rows, {} columns'.format(n_rows, n_columns))
+    for label, function in [('legacy', legacy_tree_to_frame), ('current', current_tree_to_frame)]:
+        duration, peak = measure(run_tree_to_frame, function, file_name)
+        print('TTree -> DataFrame {:8s} {:8.2f} s  peak +{:8.0f} MB'.format(label, duration, peak))
+
+    for label, function in [('legacy', legacy_frame_to_tree), ('current', current_frame_to_tree)]:
+        duration, peak = measure(run_frame_to_tree, function, n_rows, n_columns)
+        print('DataFrame -> TTree {:8s} {:8.2f} s  peak +{:8.0f} MB'.format(label, duration, peak))
+
+    os.remove(file_name)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Benchmark for writing csv files. Compares the rows per second of CsvWriter.write_rows with a loop
+over datahandling.write_to_csv, which is called once per row.
+
+Usage: bench_csv.py [n_rows ...]
+"""
+from __future__ import division, print_function
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from ekpytools.datahandling import CsvWriter, write_to_csv
+
+
+def legacy_write(file_name, rows):
+    with open(file_name, 'w') as csv_file:
+        for row in rows:
+            write_to_csv(row, csv_file)
+
+
+def buffered_write(file_name, rows):
+    with CsvWriter(file_name) as writer:
+        writer.write_rows(rows)
+
+
+def rows_per_second(func, file_name, rows):
+    start = time.time()
+    func(file_name, rows)
+    return len(rows) / (time.time() - start)
+
+
+def main(sizes=(10**6, 10**7), n_columns=5):
+    random_state = np.random.RandomState(0)
+    file_name = os.path.join(tempfile.mkdtemp(), 'bench.csv')
+
+    try:
+        for size in sizes:
+            rows = random_state.normal(0, 2, (size, n_columns))
+
+            after = rows_per_second(buffered_write, file_name, rows)
+            before = rows_per_second(legacy_write, file_name, rows)
+
+            print('{:>10d} rows  CsvWriter: {:.3e} rows/s  write_to_csv: {:.3e} rows/s  speed-up: {:.1f}x'
+                  .format(size, after, before, after / before))
+    finally:
+        if os.path.isfile(file_name):
+            os.remove(file_name)
+        os.rmdir(os.path.dirname(file_name))
+
+
+if __name__ == '__main__':
+    main(*([[int(size) for size in sys.argv[1:]]] if len(sys.argv) > 1 else []))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for Histogram.fill. Compares the events per second of the current implementation
+with the former np.histogram + per-event loop over np.digitize.
+"""
+from __future__ import division, print_function
+import timeit
+import numpy as np
+
+from ekpytools.histogram import Histogram
+
+
+def legacy_fill(values, weights, n_bins, x_limits):
+    hist, bins = np.histogram(values, bins=n_bins, range=x_limits, weights=weights)
+
+    sum_weights_sq = np.zeros(n_bins)
+    for index, weight in zip(np.digitize(values, bins, right=False), weights):
+        if 0 < index <= n_bins:
+            sum_weights_sq[index - 1] += weight**2
+
+    return hist, sum_weights_sq
+
+
+def events_per_second(func, n_events, repeat=3):
+    return n_events / min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(sizes=(10**5, 10**6, 10**7), n_bins=100, x_limits=(-5., 5.)):
+    random_state = np.random.RandomState(0)
+
+    for size in sizes:
+        values = random_state.normal(0, 2, size)
+        weights = random_state.uniform(0, 2, size)
+
+        for log in (False, True):
+            limits = (1e-3, 10.) if log else x_limits
+            sample = np.abs(values) if log else values
+
+            def fill():
+                Histogram('bench', n_bins, limits, log=log).fill(sample, weights)
+
+            after = events_per_second(fill, size)
+            line = '{:>10d} events  log={!s:<5}  fill: {:.3e} ev/s'.format(size, log, after)
+
+            if not log and size <= 10**6:
+                before = events_per_second(lambda: legacy_fill(sample, weights, n_bins, limits), size, 1)
+                line += '  legacy: {:.3e} ev/s  speed-up: {:.1f}x'.format(before, after / before)
+
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Cold start benchmark of ekpytools. Every measurement runs in a new interpreter, the time of an empty
+interpreter is subtracted. The benchmark fails if the start of the ekpy CLI takes longer than the
+budget or imports pandas, numpy, ROOT or root_numpy.
+
+Usage: bench_import.py [budget_in_seconds]
+"""
+from __future__ import division, print_function
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('pandas', 'numpy', 'ROOT', 'root_numpy')
+
+STATEMENTS = [('empty interpreter', 'pass'),
+              ('import ekpytools', 'import ekpytools'),
+              ('import ekpytools.cli', 'import ekpytools.cli'),
+              ('ekpy --help', 'from ekpytools.cli import ekpy; ekpy(["--help"])'),
+              ('import ekpytools.statistics', 'import ekpytools.statistics'),
+              ('import ekpytools.conversion', 'import ekpytools.conversion')]
+
+
+def cold_start(statement, repeat=7):
+    durations = []
+    for _ in range(repeat):
+        start = time.time()
+        with open(os.devnull, 'w') as devnull:
+            subprocess.call([sys.executable, '-c', statement], stdout=devnull)
+        durations.append(time.time() - start)
+
+    return sorted(durations)[repeat // 2]
+
+
+def loaded_heavy_modules(statement):
+    output = subprocess.check_output([sys.executable, '-c', statement + '\nimport sys\nprint(" ".join(m for m in {} '
+                                      'if m in sys.modules))'.format(HEAVY_MODULES)])
+    return output.split()
+
+
+def main(budget=0.1):
+    baseline = cold_start('pass')
+
+    for name, statement in STATEMENTS:
+        print('{:<28} {:7.3f} s'.format(name, cold_start(statement) - baseline))
+
+    cli_start = cold_start('import ekpytools.cli') - baseline
+    heavy_modules = loaded_heavy_modules('import ekpytools.cli')
+
+    if heavy_modules:
+        print('ekpy imports {}'.format(', '.join(heavy_modules)))
+    if cli_start > budget:
+        print('ekpy cold start {:.3f} s exceeds the budget of {:.3f} s'.format(cli_start, budget))
+
+    return int(bool(heavy_modules) or cli_start > budget)
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[float(argument) for argument in sys.argv[1:]]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Accuracy versus size of QuantileSketch. For several compressions the values are added in chunks and
+the sketch is compared with the exact ecdf_of_series: the maximum CDF error on a grid of points and
+the maximum rank error of the quantiles.
+
+Usage: bench_sketch.py [n_values]
+"""
+from __future__ import division, print_function
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from ekpytools.statistics import QuantileSketch, ecdf_of_series, evaluate_ecdf
+
+
+def measure(values, weights, compression, chunk_size=100000):
+    start = time.time()
+    sketch = QuantileSketch(compression)
+    for chunk in range(0, len(values), chunk_size):
+        sketch.update(values[chunk:chunk + chunk_size], weights[chunk:chunk + chunk_size])
+    n_centroids = len(sketch)
+    duration = time.time() - start
+
+    return sketch, n_centroids, duration
+
+
+def main(n_values=10**7, compressions=(25, 50, 100, 200, 500, 1000)):
+    random_state = np.random.RandomState(0)
+    distributions = [('normal', random_state.normal(0, 1, n_values)),
+                     ('exponential', random_state.exponential(1, n_values))]
+    weights = random_state.uniform(0, 2, n_values)
+
+    quantiles = np.concatenate(([1e-4, 1e-3], np.linspace(0.01, 0.99, 99), [0.999, 0.9999]))
+
+    for name, values in distributions:
+        start = time.time()
+        cdf = ecdf_of_series(pd.Series(values), pd.Series(weights))
+        exact_duration = time.time() - start
+
+        points = np.percentile(values, np.linspace(0, 100, 1001))
+        exact = evaluate_ecdf(cdf, points)
+
+        print('{} distribution, {} values, exact ECDF: {} points, {:.2f} s'.format(
+            name, n_values, len(cdf), exact_duration))
+
+        for compression in compressions:
+            sketch, n_centroids, duration = measure(values, weights, compression)
+
+            cdf_error = np.abs(sketch.cdf(points) - exact).max()
+            rank_error = np.abs(evaluate_ecdf(cdf, sketch.quantile(quantiles)) - quantiles)
+            tail = (quantiles < 0.01) | (quantiles > 0.99)
+
+            print('  compression {:>5}: {:>4} centroids ({:>6} bytes)  max CDF error {:.1e}  '
+                  'max rank error {:.1e} (tails {:.1e})  {:.2f} s'.format(
+                      compression, n_centroids, 16 * n_centroids, cdf_error, rank_error.max(),
+                      rank_error[tail].max(), duration))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark of the par-sync backends on many small files and a few large files. Compares the local copy
+backend (parallel_copy) with the rsync backend (parallel_rsync), for the first copy and for a second
+run where all files are skipped.
+
+Usage: bench_transfer.py [n_small_files n_large_files large_file_mib]
+"""
+from __future__ import division, print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+from distutils.spawn import find_executable
+
+from ekpytools._transfer import parallel_copy, parallel_rsync, format_bytes
+
+
+def create_files(directory, n_files, size):
+    file_names = []
+    block = os.urandom(min(size, 1024**2))
+
+    for index in range(n_files):
+        file_names.append(os.path.join(directory, 'file_{}_{}.dat'.format(size, index)))
+        with open(file_names[-1], 'wb') as output_file:
+            for _ in range(size // len(block)):
+                output_file.write(block)
+            output_file.write(block[:size % len(block)])
+
+    return file_names
+
+
+def measure(copy, sources, dest):
+    start = time.time()
+    results = copy(sources, dest, n=10)
+    duration = time.time() - start
+
+    assert all(result.success for result in results)
+    return duration
+
+
+def main(n_small_files=5000, n_large_files=4, large_file_mib=256):
+    directory = tempfile.mkdtemp()
+    backends = [('local', parallel_copy)]
+    if find_executable('rsync') is not None:
+        backends.append(('rsync', parallel_rsync))
+    else:
+        print('rsync is not installed, only the local backend is measured')
+
+    try:
+        source_directory = os.path.join(directory, 'sources')
+        os.mkdir(source_directory)
+
+        cases = [('{} small files'.format(n_small_files), create_files(source_directory, n_small_files, 4096)),
+                 ('{} large files'.format(n_large_files),
+                  create_files(source_directory, n_large_files, large_file_mib * 1024**2))]
+
+        for name, sources in cases:
+            total = sum(os.path.getsize(source) for source in sources)
+
+            for backend, copy in backends:
+                dest = os.path.join(directory, backend)
+                os.mkdir(dest)
+
+                first = measure(copy, sources, dest)
+                second = measure(copy, sources, dest)
+                print('{:<18} {:<6} copy: {:7.2f} s  {:>12}/s  {:8.0f} files/s  unchanged: {:7.2f} s'.format(
+                    name, backend, first, format_bytes(total / first), len(sources) / first, second))
+
+                shutil.rmtree(dest)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -1,14 +1,84 @@
-#!/usr/bin/env python 
+#!/usr/bin/env python
 __author__ = 'Michael Ziegler'
 
 __all__ = ['datahandling', 'conversion', 'plotting']
 
-from .statistics import weighted_mean, weighted_std, ecdf_of_column, ecdf_of_series
-from pandas import Series, DataFrame
+import importlib
+import sys
 
-Series.weighted_mean = weighted_mean
-Series.weighted_std = weighted_std
-Series.empirical_cdf = ecdf_of_series
 
-DataFrame.empirical_cdf = ecdf_of_column
+def weighted_mean(series, weights=None):
+    """
+    Calculate the weighted mean of a series, see ekpytools.statistics.weighted_mean.
+    """
+    from .statistics import weighted_mean
+    return weighted_mean(series, weights)
 
+
+def weighted_std(series, weights=None):
+    """
+    Calculate the weighted standard deviation of a series, see ekpytools.statistics.weighted_std.
+    """
+    from .statistics import weighted_std
+    return weighted_std(series, weights)
+
+
+def ecdf_of_column(frame, column, weight_column=None, bins=None, x_limits=None):
+    """
+    Calculate the empirical CDF of the values of column, see ekpytools.statistics.ecdf_of_column.
+    """
+    from .statistics import ecdf_of_column
+    return ecdf_of_column(frame, column, weight_column, bins, x_limits)
+
+
+def ecdf_of_series(series, weights=None, bins=None, x_limits=None):
+    """
+    Calculate the empirical CDF of the values of series, see ekpytools.statistics.ecdf_of_series.
+    """
+    from .statistics import ecdf_of_series
+    return ecdf_of_series(series, weights, bins, x_limits)
+
+
+def _register_pandas_methods():
+    """
+    Add the weighted statistics and ECDF methods of ekpytools.statistics to pandas.
+    """
+    from .statistics import weighted_mean, weighted_std, ecdf_of_column, ecdf_of_series
+    from .statistics import weighted_mean_of_frame, weighted_std_of_frame, weighted_quantiles_of_frame
+    from .statistics import grouped_weighted_mean, grouped_weighted_std, grouped_weighted_quantiles
+    from pandas import Series, DataFrame
+    from pandas.core.groupby import DataFrameGroupBy
+
+    Series.weighted_mean = weighted_mean
+    Series.weighted_std = weighted_std
+    Series.empirical_cdf = ecdf_of_series
+
+    DataFrame.empirical_cdf = ecdf_of_column
+    DataFrame.weighted_mean = weighted_mean_of_frame
+    DataFrame.weighted_std = weighted_std_of_frame
+    DataFrame.weighted_quantiles = weighted_quantiles_of_frame
+
+    DataFrameGroupBy.weighted_mean = grouped_weighted_mean
+    DataFrameGroupBy.weighted_std = grouped_weighted_std
+    DataFrameGroupBy.weighted_quantiles = grouped_weighted_quantiles
+
+
+class _PandasImportHook(object):
+    """
+    Import hook that registers the pandas methods as soon as pandas is imported, so importing ekpytools
+    does not import pandas.
+    """
+    def find_module(self, fullname, path=None):
+        return self if fullname == 'pandas' else None
+
+    def load_module(self, fullname):
+        sys.meta_path.remove(self)
+        module = importlib.import_module(fullname)
+        _register_pandas_methods()
+        return module
+
+
+if 'pandas' in sys.modules:
+    _register_pandas_methods()
+else:
+    sys.meta_path.insert(0, _PandasImportHook())
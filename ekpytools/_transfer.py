@@ -1,32 +1,551 @@
 #!/usr/bin/env python
+from __future__ import division
+import errno
+import heapq
+import os
+import shutil
 import subprocess
-from multiprocessing import Pool
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
 
-def _start_rsync(source, dest):
-    subprocess.call(['rsync', source, dest])
+# exit code of the shell if a command is not found
+_RSYNC_NOT_FOUND = 127
 
-def parallel_rsync(sources, dest, n=10):
+# errors of sendfile if it is not supported for the files
+_UNSUPPORTED_COPY_ERRORS = (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK)
+_COPY_BUFFER_SIZE = 1024**2
+
+# sendfile(2) of the C library, loaded on the first copy, False if it is not available
+_sendfile = None
+
+TransferResult = namedtuple('TransferResult', ['source', 'success', 'returncode', 'attempts'])
+
+
+def parallel_rsync(sources, dest, n=10, batch_size=100, retries=2, retry_delay=1., rsync_options=None,
+                   journal=None, callback=None, sizes=None):
+    """
+    Copy sources to dest with rsync processes that are started from a pool of n threads. The sources
+    are grouped in batches of at most batch_size files, which are copied by one rsync process with
+    --files-from. The files are distributed over the batches by size, so every batch copies about the
+    same number of bytes. If a batch fails, its files are copied one by one and every failed copy is
+    retried up to retries times, waiting retry_delay * 2**attempt seconds before each retry.
+
+    With a journal, sources that are already in the journal are not copied again and every copied source
+    is added to it as soon as its batch is finished, so an interrupted copy can be resumed.
+
+    :param sources: files that are copied, local paths or remote [user@]host:path
+    :type sources: list
+
+    :param dest: Target directory
+    :type dest: str
+
+    :param n: Number of parallel rsync processes
+    :type n: int
+
+    :param batch_size: Maximum number of files copied by one rsync process
+    :type batch_size: int
+
+    :param retries: Number of retries of a failed copy
+    :type retries: int
+
+    :param retry_delay: Waiting time in seconds before the first retry, doubled for every further retry
+    :type retry_delay: float
+
+    :param rsync_options: (optional) further command line options of rsync
+    :type rsync_options: list
+
+    :param journal: (optional) journal of the copied sources
+    :type journal: TransferJournal
+
+    :param callback: (optional) called with the results of every finished batch and their size in bytes
+    :type callback: callable
+
+    :param sizes: (optional) size in bytes of every source in the order of sources, e.g. from stat_sources.
+        Default: the sizes are read with parallel stat calls.
+    :type sizes: list
+
+    :return: result of every source in the order of sources, sources in the journal have 0 attempts
+    :rtype: list
+    """
+    results = _get_journal_results(sources, journal)
+
+    missing = [source for source in sources if source not in results]
+    if not missing:
+        return [results[source] for source in sources]
+
+    n = min(n, len(missing))
+    thread_pool = ThreadPool(n)
+    try:
+        sizes = _get_sizes(sources, missing, sizes, thread_pool)
+
+        groups = OrderedDict()
+        for source in missing:
+            size = sizes[source]
+            base, path = _split_source(source)
+            groups.setdefault(base, []).append(((source, path), size))
+
+        batches = []
+        for base, files in groups.items():
+            batches.extend((base, batch) for batch in _plan_batches(files, n, batch_size))
+
+        copy_batch = partial(_copy_batch, dest=dest, retries=retries, retry_delay=retry_delay,
+                             rsync_options=list(rsync_options or []))
+
+        _collect_results(thread_pool.imap_unordered(copy_batch, batches), results, sizes, journal, callback)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+    return [results[source] for source in sources]
+
+
+def parallel_copy(sources, dest, n=10, retries=2, retry_delay=1., journal=None, callback=None, sizes=None):
+    """
+    Copy local sources to dest in a pool of n threads without starting rsync processes. Like rsync, a
+    file is skipped if it exists in dest with the same size and modification time, the modification time
+    of copied files is set to the one of the source. On Linux the data is copied in the kernel with
+    sendfile(2), otherwise with shutil.copyfileobj. A file is first written to a temporary file in dest,
+    which is renamed when the copy is complete.
+
+    :param sources: local files that are copied
+    :type sources: list
+
+    :param dest: Target directory
+    :type dest: str
+
+    :param n: Number of threads
+    :type n: int
+
+    :param retries: Number of retries of a failed copy
+    :type retries: int
+
+    :param retry_delay: Waiting time in seconds before the first retry, doubled for every further retry
+    :type retry_delay: float
+
+    :param journal: (optional) journal of the copied sources
+    :type journal: TransferJournal
+
+    :param callback: (optional) called with the results of every finished file and its size in bytes
+    :type callback: callable
+
+    :param sizes: (optional) size in bytes of every source in the order of sources, e.g. from stat_sources.
+        Default: the sizes are read with parallel stat calls.
+    :type sizes: list
+
+    :return: result of every source in the order of sources, the return code of a failed copy is the
+        errno of the error
+    :rtype: list
+    """
+    results = _get_journal_results(sources, journal)
+
+    missing = [source for source in sources if source not in results]
+    if not missing:
+        return [results[source] for source in sources]
+
+    thread_pool = ThreadPool(min(n, len(missing)))
+    try:
+        sizes = _get_sizes(sources, missing, sizes, thread_pool)
+
+        copy = partial(_copy_with_retries, partial(_copy_local, dest=dest),
+                       retries=retries, retry_delay=retry_delay)
+
+        _collect_results(thread_pool.imap_unordered(lambda source: [copy(source)], missing),
+                         results, sizes, journal, callback)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+    return [results[source] for source in sources]
+
+
+def _get_journal_results(sources, journal):
+    if journal is None:
+        return {}
+
+    return dict((source, TransferResult(source, True, 0, 0)) for source in sources if source in journal)
+
+
+def _get_sizes(sources, missing, sizes, thread_pool):
+    """
+    Get the sizes of the missing sources from the given sizes of all sources or with stat calls in the pool.
+    """
+    if sizes is None:
+        return dict(zip(missing, thread_pool.map(_get_size, missing)))
+
+    if len(sizes) != len(sources):
+        raise ValueError('sources and sizes must have the same length.')
+
+    return dict(zip(sources, sizes))
+
+
+def _collect_results(batches_results, results, sizes, journal, callback):
+    for batch_results in batches_results:
+        for result in batch_results:
+            results[result.source] = result
+
+        if journal is not None:
+            journal.add(result.source for result in batch_results if result.success)
+        if callback is not None:
+            callback(batch_results, sum(sizes[result.source] for result in batch_results))
+
+
+def stat_sources(sources, n=10):
+    """
+    Get the sizes of local sources with n parallel stat calls. Remote and missing sources have size 0.
+
+    :param sources: files that are copied
+    :type sources: list
+
+    :param n: Number of threads
+    :type n: int
+
+    :return: size in bytes of every source
+    :rtype: list
+    """
+    if not sources:
+        return []
+
+    thread_pool = ThreadPool(min(n, len(sources)))
+    try:
+        return thread_pool.map(_get_size, sources)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+
+class TransferJournal(object):
+    """
+    Journal of the copied sources in a text file with one source per line. Added sources are written
+    to the file immediately.
+
+    :param file_name: path of the journal, it is created if it does not exist
+    :type file_name: str
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._finished = set()
+
+        if os.path.isfile(file_name):
+            with open(file_name) as journal_file:
+                self._finished.update(line.rstrip('\n') for line in journal_file if line.strip())
+
+    def __contains__(self, source):
+        return source in self._finished
+
+    def __len__(self):
+        return len(self._finished)
+
+    def add(self, sources):
+        """
+        Add finished sources to the journal.
+
+        :param sources: finished sources
+        :type sources: iterable
+        """
+        sources = [source for source in sources if source not in self._finished]
+
+        if sources:
+            with open(self.file_name, 'a') as journal_file:
+                journal_file.write(''.join(source + '\n' for source in sources))
+            self._finished.update(sources)
+
+
+class TransferProgress(object):
     """
-    Start n rsync process to copy sources to dest
-    :param source:
-    :type source:
-    :param dest:
-    :type dest:
-    :param processes:
-    :type processes:
-    :return:
-    :rtype:
+    Throughput and estimated remaining time of a transfer. It can be passed as callback to
+    parallel_rsync.
+
+    :param total_files: number of files that are copied
+    :type total_files: int
+
+    :param total_bytes: number of bytes that are copied
+    :type total_bytes: int
+
+    :param report: (optional) called with the progress after every update, at most every interval seconds
+    :type report: callable
+
+    :param interval: minimum number of seconds between two reports
+    :type interval: float
     """
-    if len(sources) < n:
-        n = len(sources)
+    def __init__(self, total_files, total_bytes, report=None, interval=5.):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.report = report
+        self.interval = interval
+        self._start = time.time()
+        self._last_report = None
 
-    pool = Pool(n)
+    def __call__(self, results, n_bytes):
+        self.files += len(results)
+        self.failed += sum(not result.success for result in results)
+        self.bytes += n_bytes
 
-    start_rsync_partial = partial(_start_rsync, dest=dest)
+        now = time.time()
+        finished = self.files >= self.total_files
+        if self.report is not None and (finished or self._last_report is None or
+                                        now - self._last_report >= self.interval):
+            self._last_report = now
+            self.report(self)
 
-    pool.map(start_rsync_partial, sources)
+    def __str__(self):
+        eta = self.eta
+        return '{}/{} files, {}/{}, {:.1f} files/s, {}/s, {} failed, ETA {}'.format(
+            self.files, self.total_files, format_bytes(self.bytes), format_bytes(self.total_bytes),
+            self.files_per_second, format_bytes(self.bytes_per_second), self.failed,
+            '-' if eta is None else timedelta(seconds=int(round(eta))))
 
+    @property
+    def elapsed(self):
+        return time.time() - self._start
 
+    @property
+    def files_per_second(self):
+        return self.files / max(self.elapsed, 1e-9)
 
+    @property
+    def bytes_per_second(self):
+        return self.bytes / max(self.elapsed, 1e-9)
+
+    @property
+    def eta(self):
+        """
+        Remaining seconds estimated from the byte rate, or from the file rate if no bytes were copied.
+        None if nothing was copied yet.
+        """
+        if self.bytes > 0:
+            return max(self.total_bytes - self.bytes, 0) / self.bytes_per_second
+        if self.files > 0:
+            return (self.total_files - self.files) / self.files_per_second
+
+        return None
+
+
+def format_bytes(n_bytes):
+    """
+    Format a number of bytes with a binary prefix, e.g. 1.5 GiB.
+
+    :param n_bytes: number of bytes
+    :type n_bytes: float
+
+    :return: formatted number
+    :rtype: str
+    """
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if abs(n_bytes) < 1024 or unit == 'TiB':
+            return '{:.1f} {}'.format(n_bytes, unit)
+        n_bytes /= 1024.
+
+
+def _plan_batches(files, n, batch_size):
+    """
+    Distribute (file, size) of files over batches with at most batch_size files, at least n batches if
+    there are enough files. The largest file is always added to the batch with the fewest bytes.
+
+    :return: files in each batch
+    :rtype: list
+    """
+    n_batches = max(-(-len(files) // batch_size), min(n, len(files)))
+
+    batches = [[] for _ in range(n_batches)]
+    heap = [(0, index) for index in range(n_batches)]
+
+    for file, size in sorted(files, key=lambda file_size: -file_size[1]):
+        total, index = heapq.heappop(heap)
+        batches[index].append(file)
+
+        if len(batches[index]) < batch_size:
+            heapq.heappush(heap, (total + size, index))
+
+    return [batch for batch in batches if batch]
+
+
+def _copy_batch(base_and_files, dest, retries, retry_delay, rsync_options):
+    base, files = base_and_files
+
+    if len(files) > 1:
+        returncode = _start_rsync_batch(base, [path for source, path in files], dest, rsync_options)
+        if returncode == 0:
+            return [TransferResult(source, True, 0, 1) for source, path in files]
+
+    start_rsync = partial(_start_rsync, dest=dest, rsync_options=rsync_options)
+
+    return [_copy_with_retries(start_rsync, source, retries, retry_delay, attempts=int(len(files) > 1))
+            for source, path in files]
+
+
+def _copy_with_retries(copy, source, retries, retry_delay, attempts=0):
+    """
+    Call copy(source) until it returns 0, at most retries + 1 times.
+    """
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(retry_delay * 2**(attempt - 1))
+
+        returncode = copy(source)
+        attempts += 1
+
+        if returncode == 0:
+            break
+
+    return TransferResult(source, returncode == 0, returncode, attempts)
+
+
+def _start_rsync(source, dest, rsync_options=()):
+    try:
+        return subprocess.call(['rsync'] + list(rsync_options) + [source, dest])
+    except OSError:
+        return _RSYNC_NOT_FOUND
+
+
+def _copy_local(source, dest):
+    """
+    Copy a local file to the directory dest, unless it exists with the same size and modification time.
+
+    :return: 0 or errno of the error
+    :rtype: int
+    """
+    target = os.path.join(dest, os.path.basename(source))
+    temp_target = os.path.join(dest, '.{}.{}.{}'.format(os.path.basename(source), os.getpid(),
+                                                         threading.current_thread().ident))
+
+    try:
+        source_stat = os.stat(source)
+
+        if os.path.isfile(target):
+            target_stat = os.stat(target)
+            if (target_stat.st_size == source_stat.st_size and
+                    int(target_stat.st_mtime) == int(source_stat.st_mtime)):
+                return 0
+
+        with open(source, 'rb') as source_file:
+            with open(temp_target, 'wb') as target_file:
+                _copy_data(source_file, target_file, source_stat.st_size)
+
+        os.utime(temp_target, (source_stat.st_atime, source_stat.st_mtime))
+        os.rename(temp_target, target)
+    except (IOError, OSError), e:
+        if os.path.isfile(temp_target):
+            os.remove(temp_target)
+        return e.errno or errno.EIO
+
+    return 0
+
+
+def _copy_data(source_file, target_file, size):
+    """
+    Copy size bytes from source_file to target_file with sendfile(2) or, if it is not available or not
+    supported by the file systems, shutil.copyfileobj.
+    """
+    sendfile = _get_sendfile()
+
+    offset = 0
+    try:
+        if sendfile is not None:
+            while offset < size:
+                copied = sendfile(target_file.fileno(), source_file.fileno(), offset, size - offset)
+                if copied == 0:
+                    break
+                offset += copied
+            return
+    except OSError, e:
+        if offset > 0 or e.errno not in _UNSUPPORTED_COPY_ERRORS:
+            raise
+
+    shutil.copyfileobj(source_file, target_file, _COPY_BUFFER_SIZE)
+
+
+def _get_sendfile():
+    """
+    Get sendfile(2) of the C library as function sendfile(out_fd, in_fd, offset, count), which returns the
+    number of copied bytes and raises OSError. Linux copies between regular files with sendfile since 2.6.33.
+
+    :return: sendfile or None if it is not available
+    :rtype: function
+    """
+    global _sendfile
+
+    if _sendfile is None:
+        _sendfile = _load_sendfile() or False
+
+    return _sendfile or None
+
+
+def _load_sendfile():
+    if not sys.platform.startswith('linux'):
+        return None
+
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        # sendfile64 takes a 64 bit offset on 32 bit systems, too
+        c_sendfile = libc.sendfile64
+    except (OSError, AttributeError):
+        return None
+
+    c_sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t]
+    c_sendfile.restype = ctypes.c_ssize_t
+
+    def sendfile(out_fd, in_fd, offset, count):
+        copied = c_sendfile(out_fd, in_fd, ctypes.byref(ctypes.c_int64(offset)), count)
+        if copied < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return copied
+
+    return sendfile
+
+
+def _start_rsync_batch(base, paths, dest, rsync_options=()):
+    """
+    Copy the files with paths relative to base with one rsync process. The list of files is passed
+    on stdin, the directories of the files are not created in dest.
+    """
+    try:
+        process = subprocess.Popen(['rsync'] + list(rsync_options) +
+                                   ['--from0', '--files-from=-', '--no-relative', base or '.', dest],
+                                   stdin=subprocess.PIPE)
+    except OSError:
+        return _RSYNC_NOT_FOUND
+
+    process.communicate('\0'.join(paths))
+
+    return process.returncode
+
+
+def _split_source(source):
+    """
+    Split a source in the root directory that is passed to rsync and the path relative to it.
+    Relative local paths stay relative to the working directory.
+    """
+    host, separator, path = source.partition(':')
+
+    if not separator or '/' in host:
+        host, path = '', source
+
+    prefix = host + ':' if host else ''
+
+    if path.startswith('/'):
+        return prefix + '/', path.lstrip('/')
+
+    return prefix, path
+
+
+def _get_size(source):
+    """
+    Size of a local file, remote files and missing files have size 0.
+    """
+    try:
+        return os.path.getsize(source)
+    except OSError:
+        return 0
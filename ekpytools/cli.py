@@ -1,9 +1,10 @@
 #!/usr/bin/env python
+from __future__ import print_function
 
 
 import click
 from datetime import datetime
-from ._transfer import parallel_rsync
+from ._transfer import parallel_rsync, parallel_copy, stat_sources, format_bytes, TransferJournal, TransferProgress
 
 
 @click.group()
@@ -15,20 +16,90 @@ def ekpy():
 @click.argument('file-sources', type=click.File(), nargs=1)
 @click.option('--dest', '-d', type=str, required=True, help='Target directory')
 @click.option('--processes', '-p', default=10, help='Number of parallel processes.')
-def par_sync(file_sources, dest, processes):
+@click.option('--batch-size', '-b', default=100, help='Maximum number of files copied by one rsync process.')
+@click.option('--retries', '-r', default=2, help='Number of retries of a failed copy.')
+@click.option('--retry-delay', default=1., help='Seconds before the first retry, doubled for every further retry.')
+@click.option('--journal', '-j', type=str, default=None,
+              help='Journal of copied files. Files in the journal are skipped, so an interrupted copy can be resumed.')
+@click.option('--interval', default=5., help='Seconds between two progress reports.')
+@click.option('--dry-run', is_flag=True, help='Only print the number and size of the files to copy.')
+@click.option('--backend', type=click.Choice(['rsync', 'local']), default='rsync',
+              help='Copy with rsync processes or, for local and mounted file systems, with threads in this process.')
+def par_sync(file_sources, dest, processes, batch_size, retries, retry_delay, journal, interval, dry_run, backend):
     """
     Parallel rsync to copy large amount of data
 
     """
-    files = [source.strip() for source in file_sources.read().split('\n')]
+    files = [source.strip() for source in file_sources.read().split('\n') if source.strip()]
 
-    print('Copy {} files'.format(len(files)))
+    if journal is not None:
+        journal = TransferJournal(journal)
+        n_finished = sum(source in journal for source in files)
+        files = [source for source in files if source not in journal]
+        print('Skip {} files in the journal'.format(n_finished))
+
+    sizes = stat_sources(files, n=processes)
+
+    print('Copy {} files with {}'.format(len(files), format_bytes(sum(sizes))))
+
+    if dry_run:
+        return
+
+    progress = TransferProgress(len(files), sum(sizes), report=print, interval=interval)
 
     start = datetime.now()
-    parallel_rsync(files, dest, n=processes)
+    if backend == 'local':
+        results = parallel_copy(files, dest, n=processes, retries=retries, retry_delay=retry_delay,
+                                journal=journal, callback=progress, sizes=sizes)
+    else:
+        results = parallel_rsync(files, dest, n=processes, batch_size=batch_size,
+                                 retries=retries, retry_delay=retry_delay, journal=journal, callback=progress,
+                                 sizes=sizes)
     end = datetime.now()
 
     duration = end - start
 
-    print('Copied {} files in {}'.format(len(files), duration))
+    failed = [result for result in results if not result.success]
+
+    print('Copied {} files in {}'.format(len(files) - len(failed), duration))
+
+    if failed:
+        for result in failed:
+            print('Failed to copy {} (exit code {}, {} attempts)'.format(result.source, result.returncode,
+                                                                        result.attempts))
+        raise click.ClickException('{} of {} files were not copied'.format(len(failed), len(files)))
+
+
+@ekpy.command()
+@click.argument('output', type=str, nargs=1)
+@click.argument('inputs', type=str, nargs=-1, required=True)
+def merge_hists(output, inputs):
+    """
+    Sum the histograms in many histogram files
+
+    """
+    from .histogram import merge_histogram_files
+
+    start = datetime.now()
+    merged = merge_histogram_files(list(inputs), output)
+    end = datetime.now()
+
+    print('Merged {} histograms from {} files in {}'.format(len(merged), len(inputs), end - start))
+
+
+@ekpy.command()
+@click.argument('index-file', type=str, nargs=1)
+@click.argument('files', type=str, nargs=-1, required=True)
+@click.option('--processes', '-p', default=None, type=int, help='Number of parallel processes.')
+def index_files(index_file, files, processes):
+    """
+    Scan ROOT files and update the index of their trees and entries
+
+    """
+    from .datahandling import build_file_index
+
+    start = datetime.now()
+    index, n_scanned = build_file_index(list(files), index_file, processes=processes)
+    end = datetime.now()
 
+    print('Indexed {} files, scanned {} new or changed files in {}'.format(len(files), n_scanned, end - start))
@@ -2,15 +2,26 @@
 __author__ = 'Michael Ziegler'
 
 
-from root_numpy import tree2array, array2tree
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
 import sys
 
 
-def convert_ttree_to_data_frame(tree, variables=None, **kwargs):
+def convert_ttree_to_data_frame(tree, variables=None, chunk_size=100000, **kwargs):
     """
     Convert a ROOT.TTree to a pandas.DataFrame using the root_numpy.tree2array
-    function.
+    function. The tree is read in chunks that are copied directly into one
+    column-wise array per dtype, which back the DataFrame without a further
+    copy. If the dtypes of the variables are interleaved, the columns are
+    reordered once at the end.
 
     :param tree: tree that is converted
     :type tree: TTree
@@ -18,22 +29,222 @@ def convert_ttree_to_data_frame(tree, variables=None, **kwargs):
     :param variables: Specify which variables should be loaded
     :type variables: list
 
+    :param chunk_size: number of entries read at once
+    :type chunk_size: int
+
+    :param kwargs: passed to root_numpy.tree2array, e.g. selection
+
     :return: Converted DataFrame
     :rtype: pandas.DataFrame
     """
-    if variables is not None:
-        array = tree2array(tree, branches=variables)
-    else:
-        array = tree2array(tree, **kwargs)
+    from root_numpy import tree2array
 
-    data_frame = pd.DataFrame(array)
+    if variables is None:
+        variables = kwargs.pop('branches', None)
+    selection = kwargs.pop('selection', None)
 
-    return data_frame
+    if kwargs:
+        array = tree2array(tree, branches=variables, selection=selection, **kwargs)
+        return _data_frame_from_chunks([array], len(array))
+
+    n_entries = _get_entries(tree)
+    if n_entries == 0:
+        return pd.DataFrame(tree2array(tree, branches=variables, selection=selection))
+
+    chunks = iterate_ttree_as_arrays(tree, variables, chunk_size=chunk_size, selection=selection)
+
+    return _data_frame_from_chunks(chunks, _capacity_hint(n_entries, selection))
+
+
+def convert_ttree_to_columns(tree, variables=None, chunk_size=100000, selection=None):
+    """
+    Convert a ROOT.TTree to one contiguous array per branch. The tree is read in
+    chunks, so the memory usage is the size of the columns plus one chunk.
+
+    :param tree: tree that is converted
+    :type tree: TTree
+
+    :param variables: Specify which variables should be loaded
+    :type variables: list
+
+    :param chunk_size: number of entries read at once
+    :type chunk_size: int
+
+    :param selection: (optional) only entries passing this selection are converted
+    :type selection: str
+
+    :return: arrays with the branch name as key
+    :rtype: OrderedDict
+    """
+    from root_numpy import tree2array
+
+    n_rows = _capacity_hint(_get_entries(tree), selection)
+    columns = None
+    position = 0
+
+    for chunk in iterate_ttree_as_arrays(tree, variables, chunk_size=chunk_size, selection=selection):
+        if columns is None:
+            columns = OrderedDict((name, np.empty(n_rows, dtype=chunk.dtype[name]))
+                                  for name in chunk.dtype.names)
+        if position + len(chunk) > n_rows:
+            n_rows = max(position + len(chunk), n_rows * 3 // 2)
+            columns = OrderedDict((name, _grow_array(column, position, n_rows))
+                                  for name, column in columns.items())
+        for name, column in columns.items():
+            column[position:position + len(chunk)] = chunk[name]
+        position += len(chunk)
+
+    if columns is None:
+        array = tree2array(tree, branches=variables, selection=selection)
+        return OrderedDict((name, np.ascontiguousarray(array[name])) for name in array.dtype.names)
+
+    return OrderedDict((name, _trim_array(column, position)) for name, column in columns.items())
 
 
-def convert_data_frame_to_ttree(data_frame, tree_name, columns=None):
+def convert_files_to_data_frame(file_names, tree_name, variables=None, selection=None,
+                                processes=None, chunk_size=100000):
     """
-    Convert a pandas.DataFrame to a ROOT.TTree
+    Convert the tree with name tree_name in many ROOT files to one DataFrame. The
+    files are converted in parallel in a pool of processes. The converted files are
+    copied in the order of the files to the columns of the DataFrame, which are
+    enlarged if the files do not fit. The dtypes of the columns are the ones of the
+    first file.
+
+    :param file_names: List with ROOT file names or glob pattern, see datahandling.load_chain_from_files
+    :type file_names: list, str
+
+    :param tree_name: name of the tree in the files
+    :type tree_name: str
+
+    :param variables: Specify which variables should be loaded
+    :type variables: list
+
+    :param selection: (optional) only entries passing this selection are converted
+    :type selection: str
+
+    :param processes: Number of processes. Default: number of CPUs.
+    :type processes: int
+
+    :param chunk_size: number of entries read at once from a file
+    :type chunk_size: int
+
+    :return: Converted DataFrame, DataFrame with entries, size in bytes and
+        conversion time in seconds per file
+    :rtype: tuple
+    """
+    from .datahandling import expand_file_names
+
+    file_name_list = expand_file_names(file_names)
+
+    pool = Pool(processes)
+    try:
+        convert_file = partial(_convert_file, tree_name=tree_name, variables=variables,
+                               selection=selection, chunk_size=chunk_size)
+
+        blocks = None
+        position = 0
+        entries = []
+        durations = []
+
+        for columns, duration in pool.imap(convert_file, file_name_list):
+            if blocks is None:
+                dtypes = [(name, column.dtype) for name, column in columns.items()]
+                blocks = _allocate_blocks(dtypes, 0)
+            blocks = _reserve_blocks(blocks, position, position + _chunk_length(columns, dtypes))
+            entries.append(_write_chunk(blocks, columns, position))
+            position += entries[-1]
+            durations.append(duration)
+    finally:
+        pool.close()
+        pool.join()
+
+    report = pd.DataFrame(OrderedDict([('entries', entries),
+                                       ('size', [os.path.getsize(name) for name in file_name_list]),
+                                       ('seconds', durations)]),
+                          index=file_name_list)
+
+    if blocks is None:
+        return pd.DataFrame(), report
+
+    return _data_frame_from_blocks(blocks, dtypes, position), report
+
+
+def iterate_ttree_as_arrays(tree, variables=None, chunk_size=100000, selection=None,
+                            start=0, stop=None, **kwargs):
+    """
+    Read a ROOT.TTree in ranges of chunk_size entries with root_numpy.tree2array,
+    so only one chunk is held in memory at a time. With start and stop only the
+    entry range of a shard (see datahandling.plan_shards) is read.
+
+    :param tree: tree that is read
+    :type tree: TTree
+
+    :param variables: Specify which variables should be loaded
+    :type variables: list
+
+    :param chunk_size: number of entries read per chunk
+    :type chunk_size: int
+
+    :param selection: (optional) only entries passing this selection are returned
+    :type selection: str
+
+    :param start: first entry that is read
+    :type start: int
+
+    :param stop: (optional) entry before which reading stops. Default: number of entries.
+    :type stop: int
+
+    :return: generator of structured arrays
+    :rtype: generator
+    """
+    from root_numpy import tree2array
+
+    n_entries = _get_entries(tree)
+    if stop is not None:
+        n_entries = min(stop, n_entries)
+
+    for chunk_start in range(start, n_entries, chunk_size):
+        yield tree2array(tree, branches=variables, selection=selection,
+                         start=chunk_start, stop=min(chunk_start + chunk_size, n_entries), **kwargs)
+
+
+def iterate_ttree_as_data_frames(tree, variables=None, chunk_size=100000, selection=None,
+                                 start=0, stop=None, **kwargs):
+    """
+    Convert a ROOT.TTree chunk by chunk to pandas.DataFrames. Each DataFrame holds
+    the entries of a range of chunk_size entries that pass the selection, so the
+    memory usage does not grow with the size of the tree.
+
+    :param tree: tree that is converted
+    :type tree: TTree
+
+    :param variables: Specify which variables should be loaded
+    :type variables: list
+
+    :param chunk_size: number of entries read per chunk
+    :type chunk_size: int
+
+    :param selection: (optional) only entries passing this selection are returned
+    :type selection: str
+
+    :param start: first entry that is converted
+    :type start: int
+
+    :param stop: (optional) entry before which the conversion stops. Default: number of entries.
+    :type stop: int
+
+    :return: generator of DataFrames
+    :rtype: generator
+    """
+    for array in iterate_ttree_as_arrays(tree, variables, chunk_size, selection, start, stop, **kwargs):
+        yield _data_frame_from_chunks([array], len(array))
+
+
+def convert_data_frame_to_ttree(data_frame, tree_name, columns=None, chunk_size=100000):
+    """
+    Convert a pandas.DataFrame to a ROOT.TTree. The columns are copied chunk by
+    chunk into a small record array that is appended to the tree, so no record
+    array of the whole DataFrame is created.
 
     :param data_frame: data that is written to a TTree
     :type data_frame: pandas.DataFrame
@@ -45,13 +256,355 @@ def convert_data_frame_to_ttree(data_frame, tree_name, columns=None):
         are written to the TTree
     :type columns: list, None
 
+    :param chunk_size: number of rows written at once
+    :type chunk_size: int
+
     :return: converted TTree
     :rtype: ROOT.TTree
     """
-    if columns is not None:
-        df_data = data_frame[columns]
-    else:
-        df_data = data_frame
-    array = df_data.to_records(index=False)
+    from root_numpy import array2tree
+
+    if columns is None:
+        columns = data_frame.columns
+
+    arrays = [(str(column), data_frame[column].values) for column in columns]
+    n_rows = len(data_frame)
+
+    chunk = np.empty(min(chunk_size, n_rows), dtype=[(name, array.dtype) for name, array in arrays])
+
+    tree = None
+    for start in range(0, n_rows, chunk_size) or [0]:
+        stop = min(start + chunk_size, n_rows)
+        for name, array in arrays:
+            chunk[name][:stop - start] = array[start:stop]
+        tree = array2tree(chunk[:stop - start], name=tree_name, tree=tree)
+
+    return tree
+
+
+class ConversionCache(object):
+    """
+    Opt-in disk cache for trees converted to DataFrames. Every converted branch is
+    stored as a .npy file in an entry for the ROOT file, tree and selection. An
+    entry is only valid as long as the size and modification time of the ROOT file
+    are unchanged. Later conversions load only the requested branches from the
+    cache and convert only the branches that are not cached yet. If the cache grows
+    above max_size bytes, the least recently used entries are removed.
+
+    :param directory: the cache is stored in this directory
+    :type directory: str
+
+    :param max_size: disk budget of the cache in bytes
+    :type max_size: int
+    """
+    def __init__(self, directory, max_size=10 * 1024**3):
+        self._directory = directory
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @property
+    def stats(self):
+        """
+        Get the statistics of the cache. A conversion is a hit if all requested
+        branches were loaded from the cache.
 
-    return array2tree(array, name=tree_name)
+        :return: hits, misses, evictions and current size in bytes
+        :rtype: dict
+        """
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=self.size())
+
+    def size(self):
+        """
+        Get the size of all cached entries in bytes.
+
+        :return: size
+        :rtype: int
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        for entry, _, _ in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def convert(self, file_name, tree_name, variables=None, selection=None, chunk_size=100000):
+        """
+        Load a tree from a ROOT file as DataFrame, see convert_ttree_to_data_frame.
+
+        :param file_name: path of the ROOT file
+        :type file_name: str
+
+        :param tree_name: name of the tree in the file
+        :type tree_name: str
+
+        :param variables: Specify which variables should be loaded. Default: all branches
+        :type variables: list
+
+        :param selection: (optional) only entries passing this selection are converted
+        :type selection: str
+
+        :param chunk_size: number of entries read at once on a cache miss
+        :type chunk_size: int
+
+        :return: Converted DataFrame
+        :rtype: pandas.DataFrame
+        """
+        if not os.path.isfile(file_name):
+            raise IOError("File %s does not exist." % file_name)
+
+        file_name = os.path.abspath(file_name)
+        file_stat = os.stat(file_name)
+        key = json.dumps([file_name, tree_name, selection])
+        entry = os.path.join(self._directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+        meta = self._load_meta(entry)
+        if meta is None or meta['size'] != file_stat.st_size or meta['mtime'] != file_stat.st_mtime:
+            shutil.rmtree(entry, ignore_errors=True)
+            os.makedirs(entry)
+            meta = dict(file=file_name, tree=tree_name, selection=selection, size=file_stat.st_size,
+                        mtime=file_stat.st_mtime, complete=False, rows=None, columns=OrderedDict())
+
+        if variables is None:
+            missing = None if not meta['complete'] else []
+        else:
+            missing = [variable for variable in variables if variable not in meta['columns']]
+
+        if missing == []:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._convert_missing(entry, meta, missing, selection, chunk_size)
+
+        names = list(meta['columns']) if variables is None else list(variables)
+        meta['used'] = time.time()
+        self._save_meta(entry, meta)
+        self._evict(keep=entry)
+
+        columns = dict((name, np.load(os.path.join(entry, '{}.npy'.format(name)), mmap_mode='r'))
+                       for name in names)
+        dtypes = [(name, columns[name].dtype) for name in names]
+
+        return _data_frame_from_chunks([columns], meta['rows'], dtypes)
+
+    def _convert_missing(self, entry, meta, variables, selection, chunk_size):
+        from .datahandling import load_tree_from_file
+
+        tree, root_file = load_tree_from_file(meta['file'], meta['tree'])
+        if tree is None:
+            raise IOError('File {} has no tree {}.'.format(meta['file'], meta['tree']))
+
+        columns = convert_ttree_to_columns(tree, variables, chunk_size=chunk_size, selection=selection)
+
+        for name, column in columns.items():
+            # write to a temporary file first, so other processes never see a partial column
+            temp_file_name = os.path.join(entry, '{}.npy.{}'.format(name, os.getpid()))
+            with open(temp_file_name, 'wb') as column_file:
+                np.save(column_file, column)
+            os.rename(temp_file_name, os.path.join(entry, '{}.npy'.format(name)))
+
+            meta['columns'][name] = column.dtype.str
+            meta['rows'] = len(column)
+
+        if variables is None:
+            meta['complete'] = True
+
+    def _evict(self, keep):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total_size = sum(size for _, size, _ in entries)
+
+        for entry, size, _ in entries:
+            if total_size <= self._max_size:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+            self.evictions += 1
+
+    def _entries(self):
+        """
+        Get (path, size, last usage) of every entry in the cache.
+        """
+        entries = []
+        for name in os.listdir(self._directory):
+            entry = os.path.join(self._directory, name)
+            meta = self._load_meta(entry)
+            if meta is None:
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file_name)) for file_name in os.listdir(entry))
+            entries.append((entry, size, meta.get('used', 0)))
+        return entries
+
+    @staticmethod
+    def _load_meta(entry):
+        try:
+            with open(os.path.join(entry, 'meta.json')) as meta_file:
+                return json.load(meta_file, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_meta(entry, meta):
+        temp_file_name = os.path.join(entry, 'meta.json.{}'.format(os.getpid()))
+        with open(temp_file_name, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.rename(temp_file_name, os.path.join(entry, 'meta.json'))
+
+
+def _convert_file(file_name, tree_name, variables, selection, chunk_size):
+    from .datahandling import load_tree_from_file
+
+    start = time.time()
+
+    tree, root_file = load_tree_from_file(file_name, tree_name)
+    if tree is None:
+        raise IOError('File {} has no tree {}.'.format(file_name, tree_name))
+    columns = convert_ttree_to_columns(tree, variables, chunk_size=chunk_size, selection=selection)
+
+    return columns, time.time() - start
+
+
+def _get_entries(tree):
+    """
+    Get the number of entries of a tree.
+    """
+    try:
+        return tree.GetEntries()
+    except AttributeError:
+        raise TypeError('tree must be a ROOT.TTree, given {}'.format(type(tree)))
+
+
+def _data_frame_from_chunks(chunks, n_rows, dtypes=None):
+    """
+    Build a DataFrame from chunks with about n_rows rows in total. A chunk is a
+    structured array or a dict of arrays, in the latter case dtypes lists (name, dtype)
+    of the columns. The columns of each dtype are copied into one 2D array, which is
+    the storage layout of pandas, so the DataFrame is created without a further copy.
+    If the chunks have more than n_rows rows, the arrays are enlarged.
+    """
+    blocks = None
+    position = 0
+
+    for chunk in chunks:
+        if blocks is None:
+            if dtypes is None:
+                dtypes = [(name, chunk.dtype[name]) for name in chunk.dtype.names]
+            blocks = _allocate_blocks(dtypes, n_rows)
+
+        blocks = _reserve_blocks(blocks, position, position + _chunk_length(chunk, dtypes))
+        position += _write_chunk(blocks, chunk, position)
+
+    if blocks is None:
+        blocks = _allocate_blocks(dtypes or [], 0)
+
+    return _data_frame_from_blocks(blocks, dtypes or [], position)
+
+
+def _allocate_blocks(dtypes, n_rows):
+    """
+    Allocate one 2D array for the columns of each dtype.
+
+    :return: (names of the columns, array) for each dtype
+    :rtype: list
+    """
+    groups = OrderedDict()
+    for name, dtype in dtypes:
+        groups.setdefault(np.dtype(dtype), []).append(name)
+
+    return [(group, np.empty((len(group), n_rows), dtype=dtype)) for dtype, group in groups.items()]
+
+
+def _reserve_blocks(blocks, n_filled, n_rows):
+    """
+    Make sure that the blocks have space for n_rows rows. A too small block is
+    replaced by one with at least 1.5 times its rows, the first n_filled rows are
+    copied.
+
+    :return: (names of the columns, array) for each dtype
+    :rtype: list
+    """
+    reserved = []
+    for group, block in blocks:
+        if block.shape[1] < n_rows:
+            block = _grow_array(block, n_filled, max(n_rows, block.shape[1] * 3 // 2))
+        reserved.append((group, block))
+
+    return reserved
+
+
+def _grow_array(array, n_filled, n_rows):
+    """
+    Copy the first n_filled entries along the last axis of array to a new array with n_rows entries.
+    """
+    grown = np.empty(array.shape[:-1] + (n_rows,), dtype=array.dtype)
+    grown[..., :n_filled] = array[..., :n_filled]
+
+    return grown
+
+
+def _trim_array(array, n_rows):
+    """
+    Get the first n_rows entries along the last axis of array. If more than a quarter of array is unused,
+    they are copied, so the unused memory is released with array.
+    """
+    if 4 * n_rows < 3 * array.shape[-1]:
+        return _grow_array(array, n_rows, n_rows)
+
+    return array[..., :n_rows]
+
+
+def _capacity_hint(n_entries, selection):
+    """
+    Get the number of rows that are allocated for a tree with n_entries entries. With a selection the
+    number of selected entries is unknown, counting them would read the tree twice, so the arrays are
+    enlarged chunk by chunk.
+    """
+    return n_entries if selection is None else 0
+
+
+def _chunk_length(chunk, dtypes):
+    """
+    Get the number of rows of a structured array or a dict of arrays with the columns of dtypes.
+    """
+    if not dtypes:
+        return 0
+
+    return len(chunk[dtypes[0][0]])
+
+
+def _write_chunk(blocks, chunk, position):
+    """
+    Copy the columns of a chunk to the blocks, starting at row position.
+
+    :return: number of rows of the chunk
+    :rtype: int
+    """
+    chunk_size = None
+    for group, block in blocks:
+        for row, name in enumerate(group):
+            column = chunk[name]
+            chunk_size = len(column)
+            block[row, position:position + chunk_size] = column
+
+    return chunk_size or 0
+
+
+def _data_frame_from_blocks(blocks, dtypes, n_rows):
+    if not blocks:
+        return pd.DataFrame(index=pd.RangeIndex(n_rows))
+
+    frames = [pd.DataFrame(_trim_array(block, n_rows).T, columns=group, copy=False) for group, block in blocks]
+    data_frame = frames[0] if len(frames) == 1 else pd.concat(frames, axis=1, copy=False)
+
+    names = [name for name, _ in dtypes]
+    if list(data_frame.columns) != names:
+        data_frame = data_frame[names]
+
+    return data_frame
@@ -3,9 +3,20 @@ from __builtin__ import isinstance
 
 __author__ = 'Michael Ziegler'
 
-from ROOT import TFile, TTree, TLeaf, TChain
+from collections import OrderedDict, namedtuple
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import json
+import operator
 import os.path
 import glob
+import numpy as np
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 
 def write_to_csv(values, csv_file, separator=","):
@@ -29,54 +40,280 @@ def write_to_csv(values, csv_file, separator=","):
     csv_file.write(separator.join(values) + "\n")
 
 
-def load_trees_from_file(file_name):
+class CsvWriter(object):
     """
-    Load all TTree from a ROOT file
+    Buffered writer of csv files. Rows are collected in a buffer that is written in blocks of
+    buffer_rows rows. Whole arrays, structured arrays or DataFrames are formatted with one string
+    formatting operation per block instead of converting every value with str().
 
-    @param file_name Name of ROOT file
-    @return dict with name of tree as key and the tree as value, ROOT file
+    :param csv_file: opened file or path of the file, which is then opened and closed by the writer
+    :type csv_file: file, str
+
+    :param separator: Columns in the file are separated with this char
+    :type separator: str
+
+    :param precision: number of significant digits of floating point numbers
+    :type precision: int
+
+    :param buffer_rows: number of rows that are buffered before they are written
+    :type buffer_rows: int
+    """
+    def __init__(self, csv_file, separator=",", precision=12, buffer_rows=100000):
+        self._owns_file = isinstance(csv_file, basestring)
+        self._csv_file = open(csv_file, 'w') if self._owns_file else csv_file
+        self.separator = separator
+        self.precision = precision
+        self.buffer_rows = buffer_rows
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_row(self, values):
+        """
+        Write one row, like write_to_csv.
+
+        :param values: List of values of the row
+        :type values: list
+        """
+        if isinstance(values, basestring):
+            values = [values]
+
+        self._buffer.append(self.separator.join(str(value) for value in values) + "\n")
+        self._buffered_rows += 1
+
+        if self._buffered_rows >= self.buffer_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+        Write many rows at once.
+
+        :param rows: 2D array with a row per entry, structured array, DataFrame or list of rows
+        :type rows: numpy.ndarray, pandas.DataFrame, list
+        """
+        columns = _get_columns(rows)
+
+        if not columns:
+            return
+
+        row_format = self.separator.replace("%", "%%").join(_column_format(column.dtype, self.precision)
+                                                            for column in columns) + "\n"
+        n_rows = len(columns[0])
+
+        for start in range(0, n_rows, self.buffer_rows):
+            stop = min(start + self.buffer_rows, n_rows)
+
+            if len(columns) == 1:
+                values = columns[0][start:stop].tolist()
+            elif _is_matrix(rows):
+                values = rows[start:stop].ravel().tolist()
+            else:
+                block = np.empty((stop - start, len(columns)), dtype=object)
+                for index, column in enumerate(columns):
+                    block[:, index] = column[start:stop].tolist()
+                values = block.ravel().tolist()
+
+            self._buffer.append(row_format * (stop - start) % tuple(values))
+            self._buffered_rows += stop - start
+
+            if self._buffered_rows >= self.buffer_rows:
+                self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows to the file.
+        """
+        if self._buffer:
+            self._csv_file.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered_rows = 0
+
+        self._csv_file.flush()
+
+    def close(self):
+        """
+        Write the buffered rows and close the file if it was opened by the writer.
+        """
+        self.flush()
+
+        if self._owns_file:
+            self._csv_file.close()
+
+
+def _get_columns(rows):
+    """
+    Get the columns of a DataFrame, structured array, 2D array or list of rows as arrays.
     """
+    if hasattr(rows, 'columns'):
+        return [rows[column].values for column in rows.columns]
 
-    if not os.path.isfile(file_name):
-        raise IOError("File %s does not exist." % file_name)
-    root_file = TFile(file_name)
+    rows = np.asarray(rows)
+
+    if rows.dtype.names is not None:
+        return [rows[name] for name in rows.dtype.names]
+
+    if rows.ndim == 1:
+        rows = rows[:, np.newaxis]
+
+    return [rows[:, index] for index in range(rows.shape[1])]
+
+
+def _is_matrix(rows):
+    return isinstance(rows, np.ndarray) and rows.ndim == 2 and rows.dtype.names is None
+
+
+def _column_format(dtype, precision):
+    if dtype.kind == 'f':
+        return '%.{}g'.format(precision)
+    if dtype.kind in 'iu':
+        return '%d'
+
+    return '%s'
+
+
+class TFilePool(object):
+    """
+    Pool of open ROOT files that are reused by the load functions. At most
+    max_open files are kept open by the pool, the least recently used file
+    is closed first, trees read from it are invalid afterwards. The files are
+    owned by the pool and shared by all callers, so they must not be closed
+    by a caller. A file that was closed anyway or is a zombie is opened again.
+    Files opened by another process, e.g. inherited by a forked
+    worker of a multiprocessing.Pool, are never used, since forked processes
+    share the file descriptor and offset of the parent and their reads would race.
+
+    :param max_open: maximum number of files kept open by the pool
+    :type max_open: int
+    """
+    def __init__(self, max_open=64):
+        self.max_open = max_open
+        self._files = OrderedDict()
+        self._pid = os.getpid()
+
+    def __len__(self):
+        self._check_process()
+        return len(self._files)
+
+    def open(self, file_name):
+        """
+        Get the open TFile with name file_name from the pool or open it.
+
+        @param file_name Name of ROOT file
+        @return TFile
+        """
+        from ROOT import TFile
 
-    if root_file.IsZombie():
-        raise IOError("Can't open root file %s." % file_name)
+        self._check_process()
+        root_file = self._files.pop(file_name, None)
 
-    keys = root_file.GetListOfKeys()
+        if root_file is None or not root_file.IsOpen() or root_file.IsZombie():
+            if not os.path.isfile(file_name):
+                raise IOError("File %s does not exist." % file_name)
+            root_file = TFile(file_name)
 
-    trees = {}
+            if root_file.IsZombie():
+                raise IOError("Can't open root file %s." % file_name)
 
-    for key in keys:
-        tree = root_file.Get(key.GetName())
+        self._files[file_name] = root_file
 
-        if isinstance(tree, TTree):
-            trees[key.GetName()] = tree
+        while len(self._files) > self.max_open:
+            self._files.popitem(last=False)[1].Close()
 
-    return trees, root_file
+        return root_file
+
+    def clear(self):
+        """
+        Close all files of the pool.
+        """
+        for root_file in self._files.values():
+            root_file.Close()
+        self._files.clear()
+
+    def _check_process(self):
+        """
+        Drop the files that were opened by the parent process of a forked process.
+        """
+        if self._pid != os.getpid():
+            self._files = OrderedDict()
+            self._pid = os.getpid()
+
+
+file_pool = TFilePool()
+
+
+class LazyTreeMapping(Mapping):
+    """
+    Read-only mapping of the names of all TTrees in a ROOT file to the trees.
+    The names are taken from the class names of the keys, a tree is only read
+    from the file when it is accessed.
+
+    :param root_file: opened ROOT file
+    :type root_file: TFile
+    """
+    def __init__(self, root_file):
+        from ROOT import TTree, TClass
+
+        self._root_file = root_file
+        self._trees = OrderedDict()
+
+        for key in root_file.GetListOfKeys():
+            if TClass.GetClass(key.GetClassName()).InheritsFrom(TTree.Class()):
+                self._trees[key.GetName()] = None
+
+    def __getitem__(self, tree_name):
+        tree = self._trees[tree_name]
+
+        if tree is None:
+            tree = self._root_file.Get(tree_name)
+            self._trees[tree_name] = tree
+
+        return tree
+
+    def __iter__(self):
+        return iter(self._trees)
+
+    def __len__(self):
+        return len(self._trees)
+
+
+def load_trees_from_file(file_name):
+    """
+    Load all TTree from a ROOT file. The file is taken from file_pool and
+    the trees are only read when they are accessed. The file is owned by
+    file_pool and shared with other callers, it must not be closed.
+
+    @param file_name Name of ROOT file
+    @return mapping with name of tree as key and the tree as value, ROOT file
+    """
+    root_file = file_pool.open(file_name)
+
+    return LazyTreeMapping(root_file), root_file
 
 
 def load_tree_from_file(file_name, tree_name):
     """
-    Load TTree with name tree_name from ROOT file with name file_name
+    Load TTree with name tree_name from ROOT file with name file_name. The
+    file is taken from file_pool and the tree is looked up by its key. The
+    file and the tree are shared with other callers of the same file, the
+    file must not be closed and branch settings like SetBranchStatus are
+    seen by all users of the tree.
 
     @return TTree, TFile
     """
-    if not os.path.isfile(file_name):
-        raise IOError("File %s does not exist." % file_name)
-    file = TFile(file_name)
+    from ROOT import TTree, TClass
 
-    if file.IsZombie():
-        raise IOError("Can't open root file %s." % file_name)
+    file = file_pool.open(file_name)
 
-    key_names = [key.GetName() for key in file.GetListOfKeys()]
+    key = file.GetKey(tree_name)
 
     tree = None
-    if tree_name in key_names:
+    if key and TClass.GetClass(key.GetClassName()).InheritsFrom(TTree.Class()):
         tree = file.Get(tree_name)
-        if not isinstance(tree, TTree):
-            tree = None
 
     return tree, file
 
@@ -89,8 +326,27 @@ def load_chain_from_files(file_names, tree_name):
     @param tree_name TTree with this name is loaded from files
     @return TChain
     """
-    file_name_list = None
+    from ROOT import TChain
 
+    file_name_list = expand_file_names(file_names)
+
+    data_chain = TChain(tree_name)
+    added_files = 0
+    for file in file_name_list:
+        added_files += data_chain.AddFile(file)
+
+    return data_chain, added_files
+
+
+def expand_file_names(file_names, check=True):
+    """
+    Get the list of files from a list of file names or a glob pattern and
+    check that all of them exist.
+
+    @param file_names List with ROOT file names or basestring "*" is allowed
+    @param check If False, the files are not checked
+    @return list of file names
+    """
     if isinstance(file_names, basestring):
         if '*' in file_names:
             file_name_list = glob.glob(file_names)
@@ -101,36 +357,451 @@ def load_chain_from_files(file_names, tree_name):
     else:
         raise TypeError("%s is not a str or list of str" % file_names)
 
+    if check:
+        for file in file_name_list:
+            if not os.path.isfile(file):
+                raise IOError("File %s does not exist." % file)
+
+    return file_name_list
+
+
+def build_file_index(file_names, index_file, processes=None):
+    """
+    Scan ROOT files and store the size, modification time, trees, number of
+    entries and branches of every file in an index file. Files that are
+    already in the index with the same size and modification time are not
+    opened again. The files are checked in a thread pool and opened in a pool
+    of processes.
+
+    :param file_names: List with ROOT file names or glob pattern
+    :type file_names: list, str
+
+    :param index_file: path of the index file. If it exists, it is updated.
+    :type index_file: str
+
+    :param processes: Number of processes. Default: number of CPUs.
+    :type processes: int
+
+    :return: index with the absolute file name as key, number of files that were scanned
+    :rtype: tuple
+    """
+    index = load_file_index(index_file) if os.path.isfile(index_file) else {}
+
+    file_name_list = [os.path.abspath(file_name)
+                      for file_name in expand_file_names(file_names, check=False)]
+
+    thread_pool = ThreadPool(min(32, len(file_name_list) or 1))
+    try:
+        stats = thread_pool.map(_stat_file, file_name_list)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+    changed = []
+    for file_name, (size, mtime) in zip(file_name_list, stats):
+        entry = index.get(file_name)
+        if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+            index[file_name] = dict(size=size, mtime=mtime, trees=None)
+            changed.append(file_name)
+
+    if changed:
+        pool = Pool(processes)
+        try:
+            for file_name, trees in zip(changed, pool.imap(_scan_file, changed)):
+                index[file_name]['trees'] = trees
+        finally:
+            pool.close()
+            pool.join()
+
+    temp_file_name = '{}.{}'.format(index_file, os.getpid())
+    with open(temp_file_name, 'w') as output_file:
+        json.dump(index, output_file, indent=1, sort_keys=True)
+    os.rename(temp_file_name, index_file)
+
+    return index, len(changed)
+
+
+def load_file_index(index_file):
+    """
+    Load an index file written by build_file_index.
+
+    :param index_file: path of the index file
+    :type index_file: str
+
+    :return: index with the absolute file name as key
+    :rtype: dict
+    """
+    with open(index_file) as input_file:
+        return json.load(input_file)
+
+
+def load_chain_from_index(index, tree_name, file_names=None):
+    """
+    Load TTree with tree_name from multiple files in a TChain, using the
+    number of entries in the index, so the files are not opened.
+
+    :param index: index or path of the index file, see build_file_index
+    :type index: dict, str
+
+    :param tree_name: TTree with this name is loaded from files
+    :type tree_name: str
+
+    :param file_names: (optional) only these files are added. Default: all files in the index with the tree.
+    :type file_names: list, str
+
+    :return: TChain, number of added files
+    :rtype: tuple
+    """
+    from ROOT import TChain
+
+    if isinstance(index, basestring):
+        index = load_file_index(index)
+
+    if file_names is None:
+        file_name_list = sorted(file_name for file_name, entry in index.items()
+                                if tree_name in entry['trees'])
+    else:
+        file_name_list = [os.path.abspath(file_name)
+                          for file_name in expand_file_names(file_names, check=False)]
+
     data_chain = TChain(tree_name)
     added_files = 0
     for file in file_name_list:
-        if not os.path.isfile(file):
-            raise IOError("File %s does not exist." % file)
+        if file not in index:
+            raise IOError("File %s is not in the index." % file)
+        if tree_name not in index[file]['trees']:
+            raise IOError("File %s has no tree %s." % (file, tree_name))
 
-        added_files += data_chain.AddFile(file)
+        added_files += data_chain.AddFile(str(file), index[file]['trees'][tree_name]['entries'])
 
     return data_chain, added_files
 
 
-def load_config_section(config_file, section, bool_options=None):
+Shard = namedtuple('Shard', ['file_name', 'start', 'stop'])
+
+
+def plan_shards(source, tree_name=None, entries_per_shard=None, bytes_per_shard=None, index=None):
     """
-    Load a configuration for a section from a config file
-    using ConfigParser
+    Split the entries of a tree in many ROOT files into shards of about the same size. Every shard is the
+    entry range [start, stop) of one file, the entries of a file are split into the smallest number of
+    equally large ranges that do not exceed the target size. The target is either a number of entries or
+    a number of bytes, which is converted to entries with the average size of an entry in the file.
+
+    The shards can be read with conversion.iterate_ttree_as_arrays, Histogram.fill_from_tree and
+    histogram.fill_from_shards or processed with run_shards.
+
+    :param source: chain, e.g. from load_chain_from_files, or list with ROOT file names or glob pattern
+    :type source: TChain, list, str
+
+    :param tree_name: name of the tree in the files. Default: name of the chain.
+    :type tree_name: str
+
+    :param entries_per_shard: maximum number of entries in a shard
+    :type entries_per_shard: int
+
+    :param bytes_per_shard: approximate maximum size of a shard in bytes on disk
+    :type bytes_per_shard: int
+
+    :param index: (optional) index or path of the index file with the number of entries and sizes of
+        the files, see build_file_index. Otherwise the files are opened to count the entries.
+    :type index: dict, str
+
+    :return: shards with file name, start and stop entry
+    :rtype: list
     """
+    from ROOT import TChain
 
-    config_parser = ConfigParser()
-    read_files = config_parser.read(config_file)
+    if (entries_per_shard is None) == (bytes_per_shard is None):
+        raise ValueError('Either entries_per_shard or bytes_per_shard must be given.')
 
-    if not read_files:
-        raise IOError("Config file %s does not exist" % config_file)
+    if isinstance(index, basestring):
+        index = load_file_index(index)
+
+    if isinstance(source, TChain):
+        tree_name = source.GetName() if tree_name is None else tree_name
+        file_name_list = [element.GetTitle() for element in source.GetListOfFiles()]
+        file_entries = _get_chain_entries(source) if index is None else None
+    else:
+        if tree_name is None:
+            raise ValueError('tree_name must be given for a list of files.')
+        file_name_list = expand_file_names(source, check=index is None)
+        file_entries = None
+
+    if file_entries is None:
+        file_entries = [_get_file_entries(file_name, tree_name, index) for file_name in file_name_list]
+
+    shards = []
+    for file_name, entries in zip(file_name_list, file_entries):
+        if entries == 0:
+            continue
+
+        if entries_per_shard is None:
+            size = _get_file_size(file_name, index)
+            max_entries = max(1, int(bytes_per_shard * entries // max(size, 1)))
+        else:
+            max_entries = entries_per_shard
+
+        n_shards = -(-entries // max_entries)
+        edges = [entries * shard // n_shards for shard in range(n_shards + 1)]
+        shards.extend(Shard(file_name, start, stop) for start, stop in zip(edges[:-1], edges[1:]))
+
+    return shards
+
+
+def run_shards(function, shards, tree_name, merge=operator.iadd, processes=None):
+    """
+    Run function(tree, start, stop) for every shard in a pool of processes and merge the results in the
+    order of the shards with merge(result, shard_result). The default merge adds the results in place,
+    which sums numbers, arrays and histograms. The function must be picklable, e.g. defined at module
+    level or a functools.partial of it.
+
+    :param function: function that processes the entries start to stop of a tree
+    :type function: callable
+
+    :param shards: (file name, start, stop) of the entry ranges, see plan_shards
+    :type shards: list
+
+    :param tree_name: name of the tree in the files
+    :type tree_name: str
+
+    :param merge: function that merges the result of a shard into the result of the previous shards
+    :type merge: callable
+
+    :param processes: Number of processes. Default: number of CPUs.
+    :type processes: int
+
+    :return: merged result, None if there are no shards
+    """
+    run_shard = partial(_run_shard, function=function, tree_name=tree_name)
+
+    result = None
+    pool = Pool(processes)
+    try:
+        for number, shard_result in enumerate(pool.imap(run_shard, shards)):
+            result = shard_result if number == 0 else merge(result, shard_result)
+    finally:
+        pool.close()
+        pool.join()
+
+    return result
+
+
+def _run_shard(shard, function, tree_name):
+    file_name, start, stop = shard
+
+    tree, root_file = load_tree_from_file(file_name, tree_name)
+    if tree is None:
+        raise IOError("File %s has no tree %s." % (file_name, tree_name))
+
+    return function(tree, start, stop)
+
+
+def _get_chain_entries(chain):
+    chain.GetEntries()
+    offsets = chain.GetTreeOffset()
+
+    return [int(offsets[tree + 1] - offsets[tree]) for tree in range(chain.GetNtrees())]
+
+
+def _get_file_entries(file_name, tree_name, index):
+    if index is not None:
+        entry = index.get(os.path.abspath(file_name))
+        if entry is None:
+            raise IOError("File %s is not in the index." % file_name)
+        if tree_name not in entry['trees']:
+            raise IOError("File %s has no tree %s." % (file_name, tree_name))
+        return entry['trees'][tree_name]['entries']
+
+    tree, root_file = load_tree_from_file(file_name, tree_name)
+    if tree is None:
+        raise IOError("File %s has no tree %s." % (file_name, tree_name))
+
+    return int(tree.GetEntries())
+
+
+def _get_file_size(file_name, index):
+    if index is not None:
+        return index[os.path.abspath(file_name)]['size']
+
+    return os.path.getsize(file_name)
+
+
+def _stat_file(file_name):
+    try:
+        file_stat = os.stat(file_name)
+    except OSError:
+        raise IOError("File %s does not exist." % file_name)
+
+    return file_stat.st_size, file_stat.st_mtime
+
+
+def _scan_file(file_name):
+    trees, root_file = load_trees_from_file(file_name)
+
+    info = {}
+    for tree_name, tree in trees.items():
+        branches = tree.GetListOfBranches()
+        info[tree_name] = dict(entries=tree.GetEntries(),
+                               branches=[branches.At(index).GetName() for index in range(branches.GetEntries())])
+
+    return info
+
+
+class FrozenDict(Mapping):
+    """
+    Immutable dictionary. It can be shared between threads and forked processes without copies.
+
+    :param args: arguments of dict
+    """
+    def __init__(self, *args, **kwargs):
+        self._dict = dict(*args, **kwargs)
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __hash__(self):
+        return hash(frozenset(self._dict.items()))
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._dict)
+
+
+class ConfigCache(object):
+    """
+    Cache of parsed config files. Every file is parsed once and parsed again only if its modification
+    time or size changes. Like ConfigParser.read, a list of files can be given, missing files in the list
+    are skipped. The options of all sections are converted with the types of a schema, see
+    load_options_from_parser, and the typed results are cached per schema.
+    """
+    def __init__(self):
+        self._files = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def load(self, config_file, schema=None):
+        """
+        Load all sections of a config file.
+
+        @param config_file Path to config file or list of paths
+        @param schema Type of each option, see load_options_from_parser
+        @return FrozenDict with a FrozenDict of the options per section
+        """
+        config_parser, typed_configs = self._get(config_file)
+
+        key = _schema_key(schema)
+        config = typed_configs.get(key)
+
+        if config is None:
+            config = FrozenDict((section, FrozenDict(load_options_from_parser(config_parser, section,
+                                                                              schema=schema)))
+                                for section in config_parser.sections())
+            typed_configs[key] = config
+
+        return config
+
+    def parser(self, config_file):
+        """
+        Get the parsed config file. The ConfigParser is shared and must not be changed.
+
+        @param config_file Path to config file or list of paths
+        @return ConfigParser
+        """
+        return self._get(config_file)[0]
+
+    def clear(self):
+        """
+        Remove all files from the cache.
+        """
+        self._files.clear()
+
+    def _get(self, config_file):
+        config_files = [config_file] if isinstance(config_file, basestring) else config_file
+        file_names = tuple(os.path.abspath(file_name) for file_name in config_files)
+
+        version = []
+        for file_name in file_names:
+            try:
+                file_stat = os.stat(file_name)
+            except OSError:
+                version.append(None)
+            else:
+                version.append((file_stat.st_mtime, file_stat.st_size))
+
+        if not any(version):
+            raise IOError("Config file %s does not exist" % config_file)
+
+        version = tuple(version)
+        entry = self._files.get(file_names)
+
+        if entry is None or entry[0] != version:
+            config_parser = ConfigParser()
+            config_parser.read(file_names)
+            entry = (version, config_parser, {})
+            self._files[file_names] = entry
+
+        return entry[1:]
+
+
+config_cache = ConfigCache()
+
+
+def load_config(config_file, schema=None):
+    """
+    Load every section of a configuration file from config_cache. The file is only parsed again if it
+    was changed, the options are converted with the types in schema.
+
+    :param config_file: Path to config file or list of paths, see ConfigCache
+    :type config_file: str, list
+
+    :param schema: Type of each option, see load_options_from_parser
+    :type schema: dict
+
+    :return: FrozenDict with a FrozenDict of the options per section
+    :rtype: FrozenDict
+    """
+    return config_cache.load(config_file, schema=schema)
+
+
+def load_config_section(config_file, section, bool_options=None, schema=None):
+    """
+    Load a configuration for a section from a config file
+    using ConfigParser. The parsed file is taken from config_cache.
+    Like ConfigParser.read, config_file can be a list of files,
+    missing files in the list are skipped.
+    """
+    config_parser = config_cache.parser(config_file)
 
     return load_options_from_parser(config_parser, section,
-                                    bool_options=bool_options)
+                                    bool_options=bool_options, schema=schema)
 
 
-def load_options_from_parser(config_parser, section, bool_options=None):
+def load_options_from_parser(config_parser, section, bool_options=None, schema=None):
     """
     Load options for a specific section from a config parser
+
+    :param config_parser: parsed config file
+    :type config_parser: ConfigParser
+
+    :param section: name of the section
+    :type section: str
+
+    :param bool_options: list with boolean options
+    :type bool_options: list, str
+
+    :param schema: Type of the options. A type is int, float, bool, str, list for a comma separated list
+        of strings, [int], [float] or [bool] for a list of these types or a function that converts the
+        string. Lists are returned as tuples. Options that are not in the schema are strings.
+    :type schema: dict
+
+    :return: Dictionary with the options
+    :rtype: dict
     """
     options = config_parser.options(section)
 
@@ -142,13 +813,18 @@ def load_options_from_parser(config_parser, section, bool_options=None):
     for option in options:
         if bool_options is not None and option in bool_options:
             option_dict[option] = config_parser.getboolean(section, option)
+        elif schema is not None and option in schema:
+            try:
+                option_dict[option] = _convert_option(config_parser.get(section, option), schema[option])
+            except ValueError, e:
+                raise ValueError("Option %s in section %s: %s" % (option, section, e))
         else:
             option_dict[option] = config_parser.get(section, option)
 
     return option_dict
 
 
-def load_all_config_sections(config_file, bool_options=None):
+def load_all_config_sections(config_file, bool_options=None, schema=None):
     """
     Load every section in a configuration file
 
@@ -158,12 +834,16 @@ def load_all_config_sections(config_file, bool_options=None):
     :param bool_options: list with boolean options
     :type bool_options:
 
+    :param schema: Type of each option, see load_options_from_parser
+    :type schema: dict
+
     :return: Dictionary with all options per section
     :rtype: dict
     """
-    config_parser = ConfigParser()
-
-    read_files = config_parser.read(config_file)
+    try:
+        config_parser = config_cache.parser(config_file)
+    except IOError:
+        return {}
 
     all_sections = config_parser.sections()
 
@@ -171,6 +851,36 @@ def load_all_config_sections(config_file, bool_options=None):
 
     for section in sorted(all_sections):
         sections_options[section] = load_options_from_parser(config_parser, section,
-                                                             bool_options=bool_options)
+                                                             bool_options=bool_options,
+                                                             schema=schema)
+
+    return sections_options
+
+
+def _convert_option(value, option_type):
+    if option_type is bool:
+        return _convert_bool(value)
+
+    if option_type is list:
+        return tuple(item.strip() for item in value.split(',') if item.strip())
+
+    if isinstance(option_type, list):
+        item_type = _convert_bool if option_type[0] is bool else option_type[0]
+        return tuple(item_type(item.strip()) for item in value.split(',') if item.strip())
+
+    return option_type(value)
+
+
+def _convert_bool(value):
+    if value.lower() not in ConfigParser._boolean_states:
+        raise ValueError("Not a boolean: %s" % value)
+
+    return ConfigParser._boolean_states[value.lower()]
+
+
+def _schema_key(schema):
+    if schema is None:
+        return None
 
-    return sections_options
\ No newline at end of file
+    return tuple(sorted((option, tuple(option_type) if isinstance(option_type, list) else option_type)
+                        for option, option_type in schema.items()))
@@ -3,6 +3,17 @@ from __future__ import division
 import numpy as np
 import pandas as pd
 import copy
+import json
+import os.path
+import struct
+from collections import OrderedDict
+from functools import partial
+from multiprocessing import Pool
+
+# Histogram files start with this magic string, followed by one record per histogram:
+# header size (little endian uint64), JSON header padded to 8 bytes, bin edges, bin content and
+# sum of squared weights as little endian float64 (content and sum including under- and overflow).
+_FILE_MAGIC = b'EKPYHIST'
 
 
 class Histogram(object):
@@ -35,9 +46,23 @@ class Histogram(object):
             self.__bins = np.linspace(x_limits[0], x_limits[1], bins + 1, endpoint=True)
         else:
             self.__bins = np.logspace(np.log10(x_limits[0]), np.log10(x_limits[1]), bins + 1, endpoint=True)
-        self.__bin_content = np.zeros(self._n_bins)
-        self.__sum_weights_sq = np.zeros(self._n_bins)
+
+        # The bins are equidistant in x or log10(x), so the bin of a value is found in closed form.
+        # Index 0 is the underflow and index n_bins + 1 the overflow.
+        lower, upper = np.log10(x_limits) if log else x_limits
+        self._index_scale = bins / (upper - lower)
+        self._index_offset = lower - 1 / self._index_scale
+        # Edges of the under- and overflow bins and the regular bins, used to correct rounding errors.
+        # The last regular bin includes the upper limit like in numpy.histogram.
+        upper_limit = np.nextafter(self.__bins[-1], np.inf)
+        self._lower_edges = np.concatenate(([-np.inf], self.__bins[:-1], [upper_limit]))
+        self._upper_edges = np.concatenate((self.__bins[:-1], [upper_limit, np.inf]))
+
+        self.__bin_content = np.zeros(self._n_bins + 2)
+        self.__sum_weights_sq = np.zeros(self._n_bins + 2)
         self._n_entries = 0
+        self._bin_error = None
+        self._cache_bin_error = True
 
     def __str__(self):
         return '{}: {}'.format(type(self), self._title)
@@ -53,35 +78,75 @@ class Histogram(object):
         :return: hist with the sum of self and other as bin content.
         :rtype: Histogram
         """
-        try:
-            self._check_hist_consistency(other)
-        except Exception, e:
-            raise e
-        hist = Histogram('sum', bins=self._n_bins, x_limits=self._x_limits, log=self._log)
-        hist.bin_content = self.bin_content + other.bin_content
-        hist.bin_error = np.sqrt(self.bin_error**2 + other.bin_error**2)
+        self._check_hist_consistency(other)
+
+        hist = self._with_arrays('sum', self.__bin_content + other.__bin_content,
+                                 self.__sum_weights_sq + other.__sum_weights_sq)
+        hist._n_entries = self._n_entries + other._n_entries
 
         return hist
 
+    def __iadd__(self, other):
+        self._check_hist_consistency(other)
+
+        self.__bin_content += other.__bin_content
+        self.__sum_weights_sq += other.__sum_weights_sq
+        self._n_entries += other._n_entries
+        self._bin_error = None
+
+        return self
+
     def __neg__(self):
-        temp = copy.deepcopy(self)
-        temp.bin_content *= -1
-        return temp
+        return self._with_arrays(self._title, -self.__bin_content, self.__sum_weights_sq.copy())
 
     def __sub__(self, other):
-        try:
-            self._check_hist_consistency(other)
-        except Exception, e:
-            raise e
-        temp = copy.deepcopy(other)
-        temp.bin_content *= -1
+        self._check_hist_consistency(other)
 
-        res = self + temp
+        if self is other:
+            sum_weights_sq = np.zeros(self.__sum_weights_sq.size)
+        else:
+            sum_weights_sq = self.__sum_weights_sq + other.__sum_weights_sq
+
+        hist = self._with_arrays('sum', self.__bin_content - other.__bin_content, sum_weights_sq)
+        hist._n_entries = self._n_entries + other._n_entries
+
+        return hist
+
+    def __isub__(self, other):
+        self._check_hist_consistency(other)
 
         if self is other:
-            res.bin_error = np.zeros(self._n_bins)
+            self.__sum_weights_sq[:] = 0
+        else:
+            self.__sum_weights_sq += other.__sum_weights_sq
+        self.__bin_content -= other.__bin_content
+        self._n_entries += other._n_entries
+        self._bin_error = None
 
-        return res
+        return self
+
+    def __mul__(self, factor):
+        """
+        Scale the histogram. Errors are scaled by the absolute value of factor.
+
+        :param factor:
+        :type factor: float
+
+        :return: scaled histogram
+        :rtype: Histogram
+        """
+        return self._with_arrays(self._title, self.__bin_content * factor,
+                                 self.__sum_weights_sq * (factor * factor))
+
+    def __rmul__(self, factor):
+        return self.__mul__(factor)
+
+    def __imul__(self, factor):
+        self.__bin_content *= factor
+        self.__sum_weights_sq *= factor * factor
+        self._bin_error = None
+
+        return self
 
     def __div__(self, other):
         return self.divide(other)
@@ -89,6 +154,12 @@ class Histogram(object):
     def __truediv__(self, other):
         return self.__div__(other)
 
+    def __idiv__(self, other):
+        return self.divide(other, inplace=True)
+
+    def __itruediv__(self, other):
+        return self.__idiv__(other)
+
     @property
     def bins(self):
         return self.__bins
@@ -109,12 +180,14 @@ class Histogram(object):
         :return: bin content
         :rtype: numpy.ndarry
         """
-        return self.__bin_content
+        return self.__bin_content[1:-1]
 
     @bin_content.setter
     def bin_content(self, content):
         """
-        Set bin content.
+        Set bin content. The content is written into the existing storage, so views, e.g. slices of a
+        HistogramND or histograms of a HistogramBank, stay attached to their storage. Read-only storage,
+        e.g. of histograms loaded with mmap_mode='r', is copied first.
 
         :param content: New bin content
         :type content: numpy.ndarray
@@ -124,22 +197,31 @@ class Histogram(object):
         except Exception, ex:
             raise ex
 
-        self.__bin_content = content
+        if not self.__bin_content.flags.writeable:
+            self.__bin_content = self.__bin_content.copy()
+        self.__bin_content[1:-1] = content
 
     @property
     def bin_error(self):
         """
-        Get the error on each bin in an array. Calculated as sqrt of sum of weight**2
+        Get the error on each bin in an array. Calculated as sqrt of sum of weight**2. The errors are
+        cached until the histogram changes, so the returned array is read-only, use the setter or a copy
+        to change them.
 
         :return: errors
         :rtype: numpy.ndarray
         """
-        return np.sqrt(self.__sum_weights_sq)
+        if self._bin_error is None or not self._cache_bin_error:
+            bin_error = np.sqrt(self.__sum_weights_sq[1:-1])
+            bin_error.flags.writeable = False
+            self._bin_error = bin_error
+
+        return self._bin_error
 
     @bin_error.setter
     def bin_error(self, errors):
         """
-        Set new bin errors
+        Set new bin errors. The errors are written into the existing storage, see bin_content.
 
         :param errors: new errors
         :type errors: numpy.ndarray
@@ -149,11 +231,35 @@ class Histogram(object):
         except Exception, ex:
             raise ex
 
-        self.__sum_weights_sq = errors**2
+        if not self.__sum_weights_sq.flags.writeable:
+            self.__sum_weights_sq = self.__sum_weights_sq.copy()
+        self.__sum_weights_sq[1:-1] = errors**2
+        self._bin_error = None
+
+    @property
+    def underflow(self):
+        """
+        Get the sum of the weights of all values below the histogram range.
+
+        :return: underflow
+        :rtype: float
+        """
+        return self.__bin_content[0]
+
+    @property
+    def overflow(self):
+        """
+        Get the sum of the weights of all values above the histogram range, including NaN.
+
+        :return: overflow
+        :rtype: float
+        """
+        return self.__bin_content[-1]
 
     def divide(self, hist, inplace=False):
         """
-        Divide the Histrogram by another Histogram hist.
+        Divide the Histrogram by another Histogram hist. Bins divided by an empty bin are inf or NaN,
+        without a warning. Under- and overflow, which are empty in both histograms, stay empty.
 
         :param hist: divisor
         :type hist: Histogram, float
@@ -164,26 +270,44 @@ class Histogram(object):
         :return: Result of division
         :rtype: Histogram
         """
-        try:
-            self._check_hist_consistency(hist)
-        except ValueError, e:
-            raise e
+        if not isinstance(hist, Histogram):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                if inplace:
+                    self.__bin_content /= hist
+                    self.__sum_weights_sq /= hist * hist
+                    self._bin_error = None
+                    return self
+                return self._with_arrays(self._title, self.__bin_content / hist,
+                                         self.__sum_weights_sq / (hist * hist))
+
+        self._check_hist_consistency(hist)
+
+        empty_flows = _empty_flows(self.__bin_content, hist.__bin_content, np.array([0, -1]))
 
-        content = self.bin_content/hist.bin_content
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # (s_a * b**2 + s_b * a**2) / b**4, computed in place with two temporaries
+            temp = np.square(self.__bin_content)
+            temp *= hist.__sum_weights_sq
+            divisor_sq = np.square(hist.__bin_content)
+            sum_weights_sq = self.__sum_weights_sq if inplace else self.__sum_weights_sq.copy()
+            sum_weights_sq *= divisor_sq
+            sum_weights_sq += temp
+            sum_weights_sq /= np.square(divisor_sq, out=divisor_sq)
 
-        new_errors_sq = (self.bin_error**2 * hist.bin_content**2 +
-                         hist.bin_error**2 * self.bin_content**2)/(hist.bin_content**4)
+            if inplace:
+                bin_content = self.__bin_content
+                bin_content /= hist.__bin_content
+            else:
+                bin_content = self.__bin_content / hist.__bin_content
+
+        bin_content[empty_flows] = 0
+        sum_weights_sq[empty_flows] = 0
 
         if inplace:
-            self.bin_content = content
-            self.bin_error = new_errors_sq
+            self._bin_error = None
             return self
-        else:
-            new_hist = Histogram('{}/{}'.format(self.title, hist.title),
-                                 self._n_bins, self._x_limits, log=self._log)
-            new_hist.bin_content = content
-            new_hist.bin_error = np.sqrt(new_errors_sq)
-            return new_hist
+
+        return self._with_arrays('{}/{}'.format(self.title, hist.title), bin_content, sum_weights_sq)
 
     def _check_content_consistency(self, content):
         if not isinstance(content, np.ndarray):
@@ -215,55 +339,1002 @@ class Histogram(object):
             values = np.array([values])
         if isinstance(values, pd.Series):
             values = values.values
-        if weights is None:
-            weights = np.full(values.size, 1.)
-        elif isinstance(weights, float):
-            weights = np.array(weights)
+        if isinstance(weights, float):
+            weights = np.full(values.size, weights)
         elif isinstance(weights, pd.Series):
             weights = weights.values
 
-        if values.size != weights.size:
+        if weights is not None and values.size != weights.size:
             raise ValueError('values and weights must have same number of entries.')
 
-        hist, bins = np.histogram(values, bins=self._n_bins, range=self._x_limits,
-                                  weights=weights, density=self._normed)
+        indices = self._bin_indices(values)
+
+        if self._normed:
+            n_bins = self._n_bins + 2
+            sum_weights = np.bincount(indices, weights=weights, minlength=n_bins).astype(np.float64)
+            sum_weights_sq = np.bincount(indices, weights=None if weights is None else weights**2,
+                                         minlength=n_bins).astype(np.float64)
+            self.__sum_weights_sq += sum_weights_sq
+            self.__sum_weights_sq *= (1/(values.size if weights is None else weights.sum()))**2
+            sum_weights[1:-1] /= sum_weights[1:-1].sum() * np.diff(self.__bins)
+            self.__bin_content += sum_weights
+            self._bin_error = None
+        else:
+            self._accumulate(indices, weights)
+
+        self._n_entries += len(values)
+
+    def fill_from_iter(self, chunks):
+        """
+        Fill histogram chunk by chunk, e.g. from a generator reading a large file. Only one chunk is held
+        in memory at a time and the result is bit-identical to a single fill with all values.
 
-        self.__sum_weights_sq += self._calc_sum_weights_squared(values, bins, weights)
+        :param chunks: iterable of values or of (values, weights) tuples
+        :type chunks: iterable
 
+        :return: self
+        :rtype: Histogram
+        """
         if self._normed:
-            self.__sum_weights_sq *= (1/(weights.sum()))**2
+            raise ValueError('Normed histograms can not be filled chunk by chunk.')
 
-        if self.__bins is None:
-            self.__bins = bins
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                self.fill(*chunk)
+            else:
+                self.fill(chunk)
 
-        self.__bin_content += hist
-        self._n_entries += len(values)
+        return self
+
+    def fill_from_tree(self, tree, branch, weight_branch=None, chunk_size=100000, selection=None,
+                       start=0, stop=None):
+        """
+        Fill histogram from a branch of a ROOT.TTree or ROOT.TChain. The tree is read in ranges of
+        chunk_size entries, so the branch is never loaded as a whole. With start and stop only the
+        entry range of a shard (see datahandling.plan_shards) is filled.
+
+        :param tree: tree with the data
+        :type tree: ROOT.TTree, ROOT.TChain
+
+        :param branch: name of the branch (or expression) that is filled
+        :type branch: str
+
+        :param weight_branch: (optional) name of the branch with the weights
+        :type weight_branch: str
+
+        :param chunk_size: number of entries read per chunk
+        :type chunk_size: int
+
+        :param selection: (optional) only entries passing this selection are filled
+        :type selection: str
+
+        :param start: first entry that is filled
+        :type start: int
+
+        :param stop: (optional) entry before which filling stops. Default: number of entries.
+        :type stop: int
+
+        :return: self
+        :rtype: Histogram
+        """
+        from .conversion import iterate_ttree_as_arrays
+
+        branches = [branch] if weight_branch is None else [branch, weight_branch]
+        arrays = iterate_ttree_as_arrays(tree, branches, chunk_size=chunk_size, selection=selection,
+                                         start=start, stop=stop)
+
+        if weight_branch is None:
+            return self.fill_from_iter(array[branch] for array in arrays)
+
+        return self.fill_from_iter((array[branch], array[weight_branch]) for array in arrays)
+
+    def _bin_indices(self, values):
+        """
+        Calculate the bin index of each value in closed form from the equidistant (log) binning. Rounding
+        errors are corrected by comparing to the bin edges, so the result agrees with numpy.histogram.
+        Values below the histogram range get the index 0 and values above (or NaN) the index n_bins + 1.
+
+        :param values: values to be binned
+        :type values: numpy.ndarray
+
+        :return: bin indices
+        :rtype: numpy.ndarray
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaled = np.log10(values) if self._log else np.array(values, dtype=np.float64)
+        scaled -= self._index_offset
+        scaled *= self._index_scale
+        np.floor(scaled, out=scaled)
+        np.clip(scaled, 0, self._n_bins + 1, out=scaled)
+
+        is_nan = np.isnan(scaled)
+        if is_nan.any():
+            # NaN or negative values in log binning
+            scaled[is_nan] = np.where(values[is_nan] < 0, 0, self._n_bins + 1)
+
+        indices = scaled.astype(np.intp)
+        with np.errstate(invalid='ignore'):
+            indices -= values < self._lower_edges[indices]
+            indices += values >= self._upper_edges[indices]
+
+        return indices
+
+    def _accumulate(self, indices, weights=None):
+        """
+        Add the weights and the squared weights of binned entries to the histogram.
+
+        :param indices: bin index of each entry, including under- and overflow
+        :type indices: numpy.ndarray
+
+        :param weights: event by event weights. If None, every entry has a weight of 1.
+        :type weights: numpy.ndarray
+        """
+        _accumulate_bins(self.__bin_content, self.__sum_weights_sq, indices, weights)
+        self._bin_error = None
+
+    def _with_arrays(self, title, bin_content, sum_weights_sq):
+        """
+        Create a histogram with the binning of self around existing arrays, including under- and
+        overflow. The bin edges are shared and the arrays are not copied, so views can be passed.
+
+        :param title: title of the new histogram
+        :type title: str
+
+        :param bin_content: bin content including under- and overflow
+        :type bin_content: numpy.ndarray
+
+        :param sum_weights_sq: sum of squared weights including under- and overflow
+        :type sum_weights_sq: numpy.ndarray
+
+        :return: new histogram
+        :rtype: Histogram
+        """
+        hist = copy.copy(self)
+        hist._title = title
+        hist.__bin_content = bin_content
+        hist.__sum_weights_sq = sum_weights_sq
+        hist._bin_error = None
+        hist._cache_bin_error = True
+        return hist
+
+    def _arrays(self):
+        """
+        Get the bin content and the sum of squared weights including under- and overflow without a copy.
+
+        :return: bin content, sum of squared weights
+        :rtype: tuple
+        """
+        return self.__bin_content, self.__sum_weights_sq
+
+
+def _accumulate_bins(bin_content, sum_weights_sq, indices, weights=None):
+    """
+    Add the weights and the squared weights of binned entries in place to the bin sums. The current sums
+    are passed to np.bincount in front of the new entries, so every bin is summed in the order of the
+    entries and the result does not depend on how the entries are split across fills.
+
+    :param bin_content: sum of weights per bin
+    :type bin_content: numpy.ndarray
+
+    :param sum_weights_sq: sum of squared weights per bin
+    :type sum_weights_sq: numpy.ndarray
+
+    :param indices: bin index of each entry
+    :type indices: numpy.ndarray
+
+    :param weights: event by event weights. If None, every entry has a weight of 1.
+    :type weights: numpy.ndarray
+    """
+    n_bins = bin_content.size
+
+    if weights is None:
+        counts = np.bincount(indices, minlength=n_bins)
+        bin_content += counts
+        sum_weights_sq += counts
+        return
+
+    all_indices = np.concatenate((np.arange(n_bins), indices))
+    buffer = np.empty(n_bins + weights.size)
+
+    buffer[:n_bins] = bin_content
+    buffer[n_bins:] = weights
+    bin_content[:] = np.bincount(all_indices, weights=buffer, minlength=n_bins)
+
+    buffer[:n_bins] = sum_weights_sq
+    np.multiply(weights, weights, out=buffer[n_bins:])
+    sum_weights_sq[:] = np.bincount(all_indices, weights=buffer, minlength=n_bins)
+
+
+def _empty_flows(bin_content, divisor_content, flows):
+    """
+    Get the under- and overflow bins, which are empty in the dividend and the divisor.
+
+    :param bin_content: bin content of the dividend including under- and overflow
+    :type bin_content: numpy.ndarray
+
+    :param divisor_content: bin content of the divisor including under- and overflow
+    :type divisor_content: numpy.ndarray
+
+    :param flows: indices of the under- and overflow bins
+    :type flows: numpy.ndarray
+
+    :return: indices of the empty under- and overflow bins
+    :rtype: numpy.ndarray
+    """
+    return flows[(bin_content[flows] == 0) & (divisor_content[flows] == 0)]
+
+
+class HistogramND(object):
+    """
+    Histogram with an arbitrary number of dimensions. Every axis is binned like a Histogram and all bins,
+    including under- and overflow of each axis, are stored in one flat contiguous array.
+
+    :param title:
+    :type title:
+
+    :param bins: number of bins for each axis
+    :type bins: list
+
+    :param limits: limits of each axis. [(lower, upper), ...]
+    :type limits: list
+
+    :param log: Use a logarithmic binning. Either one value for all axes or a list with one value per axis.
+        Default: False.
+    :type log: bool, list
+    """
+    def __init__(self, title, bins, limits, log=False):
+        if isinstance(log, bool):
+            log = [log] * len(bins)
+        if not len(bins) == len(limits) == len(log):
+            raise ValueError('bins, limits and log must have one entry per axis.')
+
+        self._title = title
+        self._axes = [Histogram('axis {}'.format(axis), n_bins, axis_limits, log=axis_log)
+                      for axis, (n_bins, axis_limits, axis_log) in enumerate(zip(bins, limits, log))]
+        self._shape = tuple(n_bins + 2 for n_bins in bins)
+
+        self.__bin_content = np.zeros(int(np.prod(self._shape)))
+        self.__sum_weights_sq = np.zeros(self.__bin_content.size)
+        self._n_entries = 0
+
+    def __str__(self):
+        return '{}: {}'.format(type(self), self._title)
+
+    def __add__(self, other):
+        """
+        Add other to the current histogram. Bin contents are added and errors are quadratically
+        added.
+
+        :param other:
+        :type other: HistogramND
+
+        :return: hist with the sum of self and other as bin content.
+        :rtype: HistogramND
+        """
+        self._check_hist_consistency(other)
+
+        hist = self._with_arrays('sum', self.__bin_content + other.__bin_content,
+                                 self.__sum_weights_sq + other.__sum_weights_sq)
+        hist._n_entries = self._n_entries + other._n_entries
+
+        return hist
+
+    def __iadd__(self, other):
+        self._check_hist_consistency(other)
+
+        self.__bin_content += other.__bin_content
+        self.__sum_weights_sq += other.__sum_weights_sq
+        self._n_entries += other._n_entries
+
+        return self
+
+    def __neg__(self):
+        return self._with_arrays(self._title, -self.__bin_content, self.__sum_weights_sq.copy())
+
+    def __sub__(self, other):
+        self._check_hist_consistency(other)
+
+        if self is other:
+            sum_weights_sq = np.zeros(self.__sum_weights_sq.size)
+        else:
+            sum_weights_sq = self.__sum_weights_sq + other.__sum_weights_sq
+
+        hist = self._with_arrays('sum', self.__bin_content - other.__bin_content, sum_weights_sq)
+        hist._n_entries = self._n_entries + other._n_entries
+
+        return hist
+
+    def __isub__(self, other):
+        self._check_hist_consistency(other)
+
+        if self is other:
+            self.__sum_weights_sq[:] = 0
+        else:
+            self.__sum_weights_sq += other.__sum_weights_sq
+        self.__bin_content -= other.__bin_content
+        self._n_entries += other._n_entries
+
+        return self
+
+    def __mul__(self, factor):
+        return self._with_arrays(self._title, self.__bin_content * factor,
+                                 self.__sum_weights_sq * (factor * factor))
+
+    def __rmul__(self, factor):
+        return self.__mul__(factor)
+
+    def __imul__(self, factor):
+        self.__bin_content *= factor
+        self.__sum_weights_sq *= factor * factor
+
+        return self
+
+    def __div__(self, other):
+        return self.divide(other)
+
+    def __truediv__(self, other):
+        return self.__div__(other)
+
+    def __idiv__(self, other):
+        return self.divide(other, inplace=True)
+
+    def __itruediv__(self, other):
+        return self.__idiv__(other)
+
+    @property
+    def bins(self):
+        """
+        Get the bin edges of each axis.
+
+        :return: bin edges
+        :rtype: list
+        """
+        return [axis.bins for axis in self._axes]
+
+    @property
+    def title(self):
+        return self._title
+
+    @title.setter
+    def title(self, title):
+        self._title = title
+
+    @property
+    def bin_content(self):
+        """
+        Get the bin content as an array with one dimension per axis. The array is a view on the
+        histogram storage without under- and overflow.
+
+        :return: bin content
+        :rtype: numpy.ndarray
+        """
+        return self._inner(self.__bin_content)
+
+    @bin_content.setter
+    def bin_content(self, content):
+        """
+        Set bin content.
+
+        :param content: New bin content
+        :type content: numpy.ndarray
+        """
+        self._check_content_consistency(content)
+
+        self._inner(self.__bin_content)[...] = content
+
+    @property
+    def bin_error(self):
+        """
+        Get the error on each bin in an array. Calculated as sqrt of sum of weight**2
+
+        :return: errors
+        :rtype: numpy.ndarray
+        """
+        return np.sqrt(self._inner(self.__sum_weights_sq))
+
+    @bin_error.setter
+    def bin_error(self, errors):
+        """
+        Set new bin errors
+
+        :param errors: new errors
+        :type errors: numpy.ndarray
+        """
+        self._check_content_consistency(errors)
+
+        self._inner(self.__sum_weights_sq)[...] = errors**2
+
+    def divide(self, hist, inplace=False):
+        """
+        Divide the histogram by another HistogramND hist. Bins divided by an empty bin are inf or NaN,
+        without a warning. Under- and overflow bins, which are empty in both histograms, stay empty.
+
+        :param hist: divisor
+        :type hist: HistogramND, float
+
+        :param inplace: If True, self will be updated.
+        :type inplace: bool
+
+        :return: Result of division
+        :rtype: HistogramND
+        """
+        if not isinstance(hist, HistogramND):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                if inplace:
+                    self.__bin_content /= hist
+                    self.__sum_weights_sq /= hist * hist
+                    return self
+                return self._with_arrays(self._title, self.__bin_content / hist,
+                                         self.__sum_weights_sq / (hist * hist))
+
+        self._check_hist_consistency(hist)
+
+        flows = np.ones(self.__bin_content.size, dtype=bool)
+        self._inner(flows)[...] = False
+        empty_flows = _empty_flows(self.__bin_content, hist.__bin_content, np.flatnonzero(flows))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            temp = np.square(self.__bin_content)
+            temp *= hist.__sum_weights_sq
+            divisor_sq = np.square(hist.__bin_content)
+            sum_weights_sq = self.__sum_weights_sq if inplace else self.__sum_weights_sq.copy()
+            sum_weights_sq *= divisor_sq
+            sum_weights_sq += temp
+            sum_weights_sq /= np.square(divisor_sq, out=divisor_sq)
+
+            if inplace:
+                bin_content = self.__bin_content
+                bin_content /= hist.__bin_content
+            else:
+                bin_content = self.__bin_content / hist.__bin_content
+
+        bin_content[empty_flows] = 0
+        sum_weights_sq[empty_flows] = 0
+
+        if inplace:
+            return self
+
+        return self._with_arrays('{}/{}'.format(self.title, hist.title), bin_content, sum_weights_sq)
+
+    def project(self, axis):
+        """
+        Project the histogram onto one axis. The bin contents of all other axes within their range are summed,
+        under- and overflow of the projected axis are kept. The projection has the number of entries of the
+        histogram.
+
+        :param axis: index of the axis
+        :type axis: int
+
+        :return: projection
+        :rtype: Histogram
+        """
+        other_axes = tuple(index for index in range(len(self._axes)) if index != axis)
+        inner = tuple(slice(None) if index == axis else slice(1, -1) for index in range(len(self._axes)))
+
+        content = self.__bin_content.reshape(self._shape)[inner].sum(axis=other_axes)
+        sum_weights_sq = self.__sum_weights_sq.reshape(self._shape)[inner].sum(axis=other_axes)
+
+        projection = self._axes[axis]._with_arrays('{} projection {}'.format(self._title, axis),
+                                                   content, sum_weights_sq)
+        projection._n_entries = self._n_entries
+
+        return projection
+
+    def slice(self, axis, bins):
+        """
+        Get the bins along one axis for fixed bins of all other axes. The returned histogram is a view on the
+        storage of this histogram, changes to its bin content are visible in both.
+
+        :param axis: index of the axis along which the histogram is sliced
+        :type axis: int
+
+        :param bins: bin index of each other axis, in the order of the axes. Bin 0 is the first regular bin.
+        :type bins: tuple
+
+        :return: slice
+        :rtype: Histogram
+        """
+        if len(bins) != len(self._axes) - 1:
+            raise ValueError('One bin index is needed for each axis except axis {}.'.format(axis))
+
+        bins = list(bins)
+        view_index = tuple(slice(None) if index == axis else bins.pop(0) + 1 for index in range(len(self._axes)))
+
+        hist_slice = self._axes[axis]._with_arrays('{} slice {}'.format(self._title, axis),
+                                                   self.__bin_content.reshape(self._shape)[view_index],
+                                                   self.__sum_weights_sq.reshape(self._shape)[view_index])
+        # the storage can be changed through this histogram, so the errors must not be cached
+        hist_slice._cache_bin_error = False
+
+        return hist_slice
+
+    def fill(self, values, weights=None, columns=None):
+        """
+        Fill histogram with values.
+
+        :param values: one column per axis
+        :type values: numpy.ndarray, pandas.DataFrame, list
+
+        :param weights: If weights are given, they are used to calculate the error in the bins and bin content is
+            sum of the weights in each bin.
+        :type weights: float, numpy.array, pandas.Series
+
+        :param columns: columns of a DataFrame used for the axes. Default: the first columns.
+        :type columns: list
+        """
+        if isinstance(values, pd.DataFrame):
+            columns = values.columns[:len(self._axes)] if columns is None else columns
+            values = [values[column].values for column in columns]
+        elif isinstance(values, np.ndarray) and values.ndim == 2:
+            values = values.T
+        else:
+            values = [value.values if isinstance(value, pd.Series) else np.asarray(value) for value in values]
+
+        if len(values) != len(self._axes):
+            raise ValueError('values must have one column per axis.')
+
+        n_values = values[0].size
+
+        if isinstance(weights, float):
+            weights = np.full(n_values, weights)
+        elif isinstance(weights, pd.Series):
+            weights = weights.values
+
+        if weights is not None and n_values != weights.size:
+            raise ValueError('values and weights must have same number of entries.')
+
+        indices = None
+        for axis, axis_shape, axis_values in zip(self._axes, self._shape, values):
+            if axis_values.size != n_values:
+                raise ValueError('All columns must have the same number of entries.')
+            if indices is None:
+                indices = axis._bin_indices(axis_values)
+            else:
+                indices *= axis_shape
+                indices += axis._bin_indices(axis_values)
+
+        _accumulate_bins(self.__bin_content, self.__sum_weights_sq, indices, weights)
+        self._n_entries += n_values
+
+    def _inner(self, array):
+        return array.reshape(self._shape)[(slice(1, -1),) * len(self._axes)]
+
+    def _with_arrays(self, title, bin_content, sum_weights_sq):
+        hist = copy.copy(self)
+        hist._title = title
+        hist.__bin_content = bin_content
+        hist.__sum_weights_sq = sum_weights_sq
+        return hist
+
+    def _check_content_consistency(self, content):
+        if not isinstance(content, np.ndarray):
+            raise TypeError('content/error must be of {}'.format(np.ndarray))
+        shape = tuple(axis_shape - 2 for axis_shape in self._shape)
+        if content.shape != shape:
+            raise ValueError('content/error must have same number of bins.'
+                             ' Needed: {}, given {}'.format(shape, content.shape))
+
+    def _check_hist_consistency(self, hist):
+        if len(self._axes) != len(hist._axes):
+            raise ValueError('Histograms must have the same number of axes.')
+        for axis, other_axis in zip(self._axes, hist._axes):
+            axis._check_hist_consistency(other_axis)
+
+
+class HistogramBank(object):
+    """
+    Many histograms that are filled together from the columns of the same data. The bins of all histograms
+    are stored in one contiguous 2D array with one row per histogram, and the weights and squared weights
+    are prepared once per fill for all histograms.
+
+    :param histograms: histograms with the column that is filled as key. The bank stores the content of
+        each histogram and bank[column] returns a histogram that is a view on the bank storage.
+    :type histograms: dict
+    """
+    def __init__(self, histograms):
+        if any(hist._normed for hist in histograms.values()):
+            raise ValueError('Normed histograms can not be filled in a bank.')
+
+        self._columns = list(histograms)
+        width = max(hist._n_bins for hist in histograms.values()) + 2
+
+        self._bin_content = np.zeros((len(self._columns), width))
+        self._sum_weights_sq = np.zeros((len(self._columns), width))
+        self._histograms = {}
+
+        for row, column in enumerate(self._columns):
+            template = histograms[column]
+            bin_content, sum_weights_sq = template._arrays()
+            n_bins = bin_content.size
+
+            self._bin_content[row, :n_bins] = bin_content
+            self._sum_weights_sq[row, :n_bins] = sum_weights_sq
+
+            hist = template._with_arrays(template.title, self._bin_content[row, :n_bins],
+                                         self._sum_weights_sq[row, :n_bins])
+            # the storage is changed by the bank, so the errors must not be cached
+            hist._cache_bin_error = False
+            self._histograms[column] = hist
+
+    def __getitem__(self, column):
+        return self._histograms[column]
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    @property
+    def histograms(self):
+        """
+        Get all histograms of the bank.
+
+        :return: histograms with their column as key
+        :rtype: dict
+        """
+        return dict(self._histograms)
+
+    def fill(self, data, weights=None):
+        """
+        Fill every histogram with its column of data. The result is identical to filling each histogram
+        separately.
 
-    def _calc_sum_weights_squared(self, series, bins, weights=None):
+        :param data: data with the columns of the histograms
+        :type data: pandas.DataFrame, numpy.ndarray (structured), dict
+
+        :param weights: weights or name of the weight column in data
+        :type weights: str, float, numpy.ndarray, pandas.Series
         """
-        Calculate the sum of the squared weights for each bin of a histogram. If weights are None,
-        they are set to 1 -> Sum is equal to the number of events in the bin.
+        if isinstance(weights, basestring):
+            weights = data[weights]
+        if isinstance(weights, pd.Series):
+            weights = weights.values
+
+        n_values = len(data[self._columns[0]])
+
+        if isinstance(weights, float):
+            weights = np.full(n_values, weights)
+
+        if weights is not None and n_values != weights.size:
+            raise ValueError('values and weights must have same number of entries.')
+
+        width = self._bin_content.shape[1]
 
-        :param series: Contains the values
-        :type series: numpy.array
+        if weights is not None:
+            # Every histogram is summed with np.bincount on top of its current bin sums (see _accumulate_bins).
+            # Only the leading bin sums change between the histograms, the weights are written once.
+            all_indices = np.empty(width + n_values, dtype=np.intp)
+            all_indices[:width] = np.arange(width)
+            weights_buffer = np.empty(width + n_values)
+            weights_buffer[width:] = weights
+            weights_sq_buffer = np.empty(width + n_values)
+            np.multiply(weights, weights, out=weights_sq_buffer[width:])
 
-        :param bins: The used bins in the histogram
-        :type bins: numpy.array
+        for row, column in enumerate(self._columns):
+            hist = self._histograms[column]
+            values = data[column]
+            if isinstance(values, pd.Series):
+                values = values.values
 
-        :param weights: event by event weights
-        :type weights: numpy.array
+            if values.size != n_values:
+                raise ValueError('All columns must have the same number of entries.')
 
-        :return: sums per bins
-        :rtype: np.ndarray
+            indices = hist._bin_indices(values)
+
+            if weights is None:
+                counts = np.bincount(indices, minlength=width)
+                self._bin_content[row] += counts
+                self._sum_weights_sq[row] += counts
+            else:
+                all_indices[width:] = indices
+                weights_buffer[:width] = self._bin_content[row]
+                self._bin_content[row] = np.bincount(all_indices, weights=weights_buffer, minlength=width)
+                weights_sq_buffer[:width] = self._sum_weights_sq[row]
+                self._sum_weights_sq[row] = np.bincount(all_indices, weights=weights_sq_buffer, minlength=width)
+
+            hist._n_entries += n_values
+
+    def fill_from_iter(self, chunks):
         """
-        if weights is None:
-            weights = np.full(len(series), 1)
+        Fill the bank chunk by chunk. Only one chunk is held in memory at a time.
+
+        :param chunks: iterable of data or of (data, weights) tuples
+        :type chunks: iterable
+
+        :return: self
+        :rtype: HistogramBank
+        """
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                self.fill(*chunk)
+            else:
+                self.fill(chunk)
+
+        return self
+
+
+def fill_from_files(histograms, file_names, tree_name, weight_branch=None, selection=None,
+                    processes=None, chunk_size=100000):
+    """
+    Fill histograms from the branches of a tree in many ROOT files. The files are distributed over a pool
+    of processes, each file is filled into empty copies of the histograms and only the bin arrays are sent
+    back. They are summed in the order of the files like Histogram.__add__ (contents are added, errors
+    quadratically), so the result does not depend on the number of processes.
+
+    :param histograms: Empty histograms with the branch that is filled as key
+    :type histograms: dict
+
+    :param file_names: List with ROOT file names or glob pattern, see datahandling.load_chain_from_files
+    :type file_names: list, str
+
+    :param tree_name: name of the tree in the files
+    :type tree_name: str
+
+    :param weight_branch: (optional) name of the branch with the weights
+    :type weight_branch: str
+
+    :param selection: (optional) only entries passing this selection are filled
+    :type selection: str
+
+    :param processes: Number of processes. Default: number of CPUs.
+    :type processes: int
+
+    :param chunk_size: number of entries read at once from a file
+    :type chunk_size: int
+
+    :return: filled histograms with the branch as key
+    :rtype: dict
+    """
+    from .datahandling import expand_file_names
+
+    if any(hist._normed for hist in histograms.values()):
+        raise ValueError('Normed histograms can not be filled file by file.')
+
+    file_name_list = expand_file_names(file_names)
+
+    fill_file = partial(_fill_from_file, histograms=histograms, tree_name=tree_name,
+                        weight_branch=weight_branch, selection=selection, chunk_size=chunk_size)
+
+    return _fill_in_pool(histograms, fill_file, file_name_list, processes)
+
+
+def fill_from_shards(histograms, shards, tree_name, weight_branch=None, selection=None,
+                     processes=None, chunk_size=100000):
+    """
+    Fill histograms from the entry ranges of shards, see datahandling.plan_shards. The shards are
+    distributed over a pool of processes and summed in their order like in fill_from_files, so the
+    result does not depend on the number of processes or on the size of the shards.
+
+    :param histograms: Empty histograms with the branch that is filled as key
+    :type histograms: dict
+
+    :param shards: (file name, start, stop) of the entry ranges that are filled
+    :type shards: list
+
+    :param tree_name: name of the tree in the files
+    :type tree_name: str
+
+    :param weight_branch: (optional) name of the branch with the weights
+    :type weight_branch: str
+
+    :param selection: (optional) only entries passing this selection are filled
+    :type selection: str
+
+    :param processes: Number of processes. Default: number of CPUs.
+    :type processes: int
+
+    :param chunk_size: number of entries read at once from a file
+    :type chunk_size: int
+
+    :return: filled histograms with the branch as key
+    :rtype: dict
+    """
+    if any(hist._normed for hist in histograms.values()):
+        raise ValueError('Normed histograms can not be filled shard by shard.')
+
+    fill_shard = partial(_fill_from_shard, histograms=histograms, tree_name=tree_name,
+                         weight_branch=weight_branch, selection=selection, chunk_size=chunk_size)
+
+    return _fill_in_pool(histograms, fill_shard, shards, processes)
+
+
+def _fill_in_pool(histograms, fill, items, processes):
+    if processes == 1:
+        return _sum_file_results(histograms, map(fill, items))
+
+    pool = Pool(processes)
+    try:
+        return _sum_file_results(histograms, pool.imap(fill, items))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _sum_file_results(histograms, results):
+    filled = dict((branch, _empty_copy(hist)) for branch, hist in histograms.items())
+
+    for result in results:
+        for branch, (bin_content, sum_weights_sq, n_entries) in result.items():
+            file_hist = filled[branch]._with_arrays(branch, bin_content, sum_weights_sq)
+            file_hist._n_entries = n_entries
+            filled[branch] += file_hist
+
+    return filled
+
+
+def _empty_copy(hist):
+    bin_content, sum_weights_sq = hist._arrays()
+    empty_hist = hist._with_arrays(hist.title, np.zeros(bin_content.size), np.zeros(sum_weights_sq.size))
+    empty_hist._n_entries = 0
+    return empty_hist
+
+
+def _fill_from_shard(shard, histograms, tree_name, weight_branch, selection, chunk_size):
+    file_name, start, stop = shard
+    return _fill_from_file(file_name, histograms, tree_name, weight_branch, selection, chunk_size,
+                           start=start, stop=stop)
+
+
+def _fill_from_file(file_name, histograms, tree_name, weight_branch, selection, chunk_size,
+                    start=0, stop=None):
+    """
+    Fill empty copies of the histograms from one file or from the entries start to stop of the file.
+
+    :return: bin content, sum of squared weights and number of entries of each histogram
+    :rtype: dict
+    """
+    from .conversion import iterate_ttree_as_arrays
+    from .datahandling import load_tree_from_file
+
+    tree, root_file = load_tree_from_file(file_name, tree_name)
+    if tree is None:
+        raise IOError('File {} has no tree {}.'.format(file_name, tree_name))
+
+    bank = HistogramBank(dict((branch, _empty_copy(hist)) for branch, hist in histograms.items()))
+    branches = list(bank)
+    if weight_branch is not None and weight_branch not in branches:
+        branches.append(weight_branch)
+
+    for array in iterate_ttree_as_arrays(tree, branches, chunk_size=chunk_size, selection=selection,
+                                         start=start, stop=stop):
+        bank.fill(array, weight_branch)
+
+    return dict((branch, hist._arrays() + (hist._n_entries,)) for branch, hist in bank.histograms.items())
+
+
+def save_histograms(file_name, histograms, append=False):
+    """
+    Write histograms to a histogram file. The arrays are stored in a binary format that can be loaded
+    without a copy with load_histograms.
+
+    :param file_name: path of the file
+    :type file_name: str
+
+    :param histograms: histograms with their name as key
+    :type histograms: dict, HistogramBank
+
+    :param append: If True, the histograms are appended to an existing file.
+    :type append: bool
+    """
+    if isinstance(histograms, HistogramBank):
+        histograms = histograms.histograms
+
+    append = append and os.path.isfile(file_name) and os.path.getsize(file_name) > 0
+    if append:
+        _check_histogram_file(file_name)
+
+    with open(file_name, 'ab' if append else 'wb') as output_file:
+        if not append:
+            output_file.write(_FILE_MAGIC)
+
+        for name, hist in histograms.items():
+            header = json.dumps(dict(name=name, title=hist.title, bins=int(hist._n_bins),
+                                     x_limits=[float(limit) for limit in hist._x_limits],
+                                     log=bool(hist._log), normed=bool(hist._normed),
+                                     n_entries=int(hist._n_entries))).encode('utf-8')
+            header += b' ' * (-len(header) % 8)
+
+            output_file.write(struct.pack('<Q', len(header)))
+            output_file.write(header)
+            for array in (hist.bins,) + hist._arrays():
+                output_file.write(np.ascontiguousarray(array, dtype='<f8').tobytes())
+
+
+def iter_histograms(file_name, mmap_mode='r'):
+    """
+    Iterate over all histograms in a histogram file. The bin content and errors of the histograms are
+    numpy.memmap views on the file, nothing is read before it is accessed.
+
+    :param file_name: path of the file
+    :type file_name: str
+
+    :param mmap_mode: mode of the numpy.memmap. 'r': read only, 'r+': changes are written to the file,
+        'c': changes are kept in memory only.
+    :type mmap_mode: str
+
+    :return: generator of (name, histogram)
+    :rtype: generator
+    """
+    _check_histogram_file(file_name)
+
+    data = np.memmap(file_name, dtype=np.uint8, mode=mmap_mode)
+    offset = len(_FILE_MAGIC)
+
+    while offset < data.size:
+        header_size = struct.unpack('<Q', data[offset:offset + 8].tobytes())[0]
+        offset += 8
+        header = json.loads(data[offset:offset + header_size].tobytes().decode('utf-8'))
+        offset += header_size
+
+        n_bins = header['bins']
+        arrays = []
+        for size in (n_bins + 1, n_bins + 2, n_bins + 2):
+            arrays.append(data[offset:offset + 8 * size].view('<f8'))
+            offset += 8 * size
+
+        hist = Histogram(header['title'], n_bins, tuple(header['x_limits']), log=header['log'],
+                         normed=header['normed'])
+        hist = hist._with_arrays(header['title'], arrays[1], arrays[2])
+        hist._n_entries = header['n_entries']
+
+        yield header['name'], hist
+
+
+def load_histograms(file_name, mmap_mode='r'):
+    """
+    Load all histograms from a histogram file without copying their arrays, see iter_histograms.
+
+    :param file_name: path of the file
+    :type file_name: str
+
+    :param mmap_mode: mode of the numpy.memmap
+    :type mmap_mode: str
+
+    :return: histograms with their name as key
+    :rtype: OrderedDict
+    """
+    histograms = OrderedDict()
+
+    for name, hist in iter_histograms(file_name, mmap_mode=mmap_mode):
+        if name in histograms:
+            raise ValueError('Histogram {} is stored more than once in {}. '
+                             'Use merge_histogram_files to sum them.'.format(name, file_name))
+        histograms[name] = hist
+
+    return histograms
+
+
+def merge_histogram_files(file_names, output_file_name):
+    """
+    Sum the histograms with the same name in many histogram files and write the sums to a new file. The
+    files are read one after another, only the sums are held in memory.
+
+    :param file_names: List with file names or glob pattern, see datahandling.load_chain_from_files
+    :type file_names: list, str
+
+    :param output_file_name: the sums are written to this file
+    :type output_file_name: str
+
+    :return: summed histograms with their name as key
+    :rtype: OrderedDict
+    """
+    from .datahandling import expand_file_names
+
+    merged = OrderedDict()
+
+    for file_name in expand_file_names(file_names):
+        for name, hist in iter_histograms(file_name):
+            if name not in merged:
+                merged[name] = _empty_copy(hist)
+            merged[name] += hist
+
+    save_histograms(output_file_name, merged)
 
-        bin_sum_weight_sq = np.zeros(self._n_bins)
-        bin_indices = np.digitize(series, bins, right=False)
+    return merged
 
-        for index, value, weight in zip(bin_indices, series, weights):
-            if 0 < index <= self._n_bins:
-                bin_sum_weight_sq[index - 1] += weight**2
 
-        return bin_sum_weight_sq
+def _check_histogram_file(file_name):
+    with open(file_name, 'rb') as input_file:
+        if input_file.read(len(_FILE_MAGIC)) != _FILE_MAGIC:
+            raise IOError('{} is not a histogram file.'.format(file_name))
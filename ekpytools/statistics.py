@@ -1,9 +1,426 @@
 #!/usr/bin/env python
 from __future__ import division, absolute_import, print_function
-import pandas as pd
+import copy
 import numpy as np
 
 
+class WeightedMoments(object):
+    """
+    Weighted mean, variance, skewness and kurtosis of values that are added chunk by chunk. Every chunk
+    is reduced to its sum of weights, mean and central moment sums, which are combined with the ones of
+    the previous chunks with the pairwise update of Chan et al. (generalised to the third and fourth
+    moment by Pebay). Since no raw power sums are used, the result is stable for values with a large
+    offset. Moments of different parts of the data, e.g. computed in parallel processes, are merged
+    with merge or +.
+
+    The mean of a chunk with negative weights that sum to 0 is not defined. Such a chunk is reduced to its
+    moment sums around the current mean instead, so it still contributes to the mean and the higher moments.
+
+    :param chunk_size: number of values reduced at once by update
+    :type chunk_size: int
+    """
+    def __init__(self, chunk_size=100000):
+        self.chunk_size = chunk_size
+        self.sum_weights = 0.
+        self._mean = 0.
+        # sum(w * (x - mean)), 0 unless the sum of weights is 0
+        self._m1 = 0.
+        self._m2 = 0.
+        self._m3 = 0.
+        self._m4 = 0.
+
+    def __add__(self, other):
+        result = copy.copy(self)
+        return result.merge(other)
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def update(self, values, weights=None):
+        """
+        Add values to the moments. Values that are NaN are ignored.
+
+        :param values: values
+        :type values: numpy.ndarray, pandas.Series
+
+        :param weights: (optional) weight of each value
+        :type weights: numpy.ndarray, pandas.Series
+
+        :return: self
+        :rtype: WeightedMoments
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            if len(weights) != len(values):
+                raise ValueError('values and weights must have same length.')
+
+        for start in range(0, len(values), self.chunk_size):
+            stop = start + self.chunk_size
+            self._merge_moments(*_chunk_moments(values[start:stop],
+                                                None if weights is None else weights[start:stop],
+                                                None if self._is_empty() else self._mean))
+
+        return self
+
+    def merge(self, other):
+        """
+        Add the moments of other, which were calculated from other values.
+
+        :param other: moments of other values
+        :type other: WeightedMoments
+
+        :return: self
+        :rtype: WeightedMoments
+        """
+        self._merge_moments(other.sum_weights, other._mean, other._m1, other._m2, other._m3, other._m4)
+        return self
+
+    @property
+    def mean(self):
+        """
+        Weighted mean, NaN if the sum of weights is 0.
+        """
+        return self._mean if self.sum_weights != 0 else np.nan
+
+    @property
+    def variance(self):
+        """
+        Weighted variance sum(w * (x - mean)**2) / sum(w).
+        """
+        return self._m2 / self.sum_weights if self.sum_weights != 0 else np.nan
+
+    @property
+    def std(self):
+        """
+        Weighted standard deviation, square root of the variance.
+        """
+        return np.sqrt(self.variance)
+
+    @property
+    def skewness(self):
+        """
+        Weighted skewness m3 / m2**1.5 of the central moments m_k = sum(w * (x - mean)**k) / sum(w).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._m3 / self.sum_weights) / self.variance**1.5
+
+    @property
+    def kurtosis(self):
+        """
+        Weighted excess kurtosis m4 / m2**2 - 3 of the central moments m_k = sum(w * (x - mean)**k) / sum(w).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._m4 / self.sum_weights) / self.variance**2 - 3
+
+    def _is_empty(self):
+        return self.sum_weights == 0 and self._m1 == self._m2 == self._m3 == self._m4 == 0
+
+    def _merge_moments(self, sum_weights, mean, m1, m2, m3, m4):
+        if sum_weights == 0 and m1 == m2 == m3 == m4 == 0:
+            return
+        if self._is_empty():
+            self.sum_weights, self._mean = sum_weights, mean
+            self._m1, self._m2, self._m3, self._m4 = m1, m2, m3, m4
+            self._center()
+            return
+        if sum_weights == 0 or self.sum_weights == 0 or self.sum_weights + sum_weights == 0:
+            # at least one mean is not defined, add the moment sums around the mean of self
+            sums = _shift_moment_sums((sum_weights, m1, m2, m3, m4), mean - self._mean)
+            self.sum_weights += sums[0]
+            self._m1 += sums[1]
+            self._m2 += sums[2]
+            self._m3 += sums[3]
+            self._m4 += sums[4]
+            self._center()
+            return
+
+        total = self.sum_weights + sum_weights
+        weights_a, weights_b = self.sum_weights, sum_weights
+        delta = mean - self._mean
+        delta_total = delta / total
+
+        m4 = (self._m4 + m4 +
+              delta * delta_total**3 * weights_a * weights_b * (weights_a**2 - weights_a * weights_b + weights_b**2) +
+              6 * delta_total**2 * (weights_a**2 * m2 + weights_b**2 * self._m2) +
+              4 * delta_total * (weights_a * m3 - weights_b * self._m3))
+        m3 = (self._m3 + m3 +
+              delta * delta_total**2 * weights_a * weights_b * (weights_a - weights_b) +
+              3 * delta_total * (weights_a * m2 - weights_b * self._m2))
+        m2 = self._m2 + m2 + delta * delta_total * weights_a * weights_b
+
+        self.sum_weights = total
+        self._mean += delta_total * weights_b
+        self._m2, self._m3, self._m4 = m2, m3, m4
+
+    def _center(self):
+        """
+        Move the moment sums to the mean, if the sum of weights is not 0.
+        """
+        if self.sum_weights == 0 or self._m1 == 0:
+            return
+
+        delta = self._m1 / self.sum_weights
+        _, _, self._m2, self._m3, self._m4 = _shift_moment_sums(
+            (self.sum_weights, self._m1, self._m2, self._m3, self._m4), -delta)
+        self._mean += delta
+        self._m1 = 0.
+
+
+def weighted_moments(values, weights=None, chunk_size=100000):
+    """
+    Calculate the weighted moments of values in one pass, see WeightedMoments.
+
+    :param values: values
+    :type values: numpy.ndarray, pandas.Series
+
+    :param weights: (optional) weight of each value
+    :type weights: numpy.ndarray, pandas.Series
+
+    :param chunk_size: number of values reduced at once
+    :type chunk_size: int
+
+    :return: moments of the values
+    :rtype: WeightedMoments
+    """
+    return WeightedMoments(chunk_size).update(values, weights)
+
+
+def _chunk_moments(values, weights, mean=None):
+    """
+    Sum of weights, mean and moment sums sum(w * (x - mean)**k) for k = 1..4 of one chunk. If the weights
+    sum to 0, the moment sums are taken around the given mean or, if it is None, the unweighted mean.
+    """
+    valid = ~np.isnan(values)
+    if not valid.all():
+        values = values[valid]
+        weights = None if weights is None else weights[valid]
+
+    if len(values) == 0:
+        return 0., 0., 0., 0., 0., 0.
+
+    if weights is None:
+        sum_weights = float(len(values))
+        mean = values.sum() / sum_weights
+        deltas = values - mean
+        weighted_deltas_sq = deltas * deltas
+    else:
+        sum_weights = weights.sum()
+        if sum_weights == 0:
+            mean = values.mean() if mean is None else mean
+        else:
+            mean = np.dot(weights, values) / sum_weights
+        deltas = values - mean
+        weighted_deltas_sq = weights * deltas * deltas
+
+    m1 = np.dot(weights, deltas) if sum_weights == 0 else 0.
+
+    return (sum_weights, mean, m1, weighted_deltas_sq.sum(), np.dot(weighted_deltas_sq, deltas),
+            np.dot(weighted_deltas_sq, deltas * deltas))
+
+
+def _shift_moment_sums(sums, delta):
+    """
+    Get the moment sums sum(w * (x - c + delta)**k) for k = 0..4 from the ones around c.
+    """
+    s0, s1, s2, s3, s4 = sums
+
+    return (s0,
+            s1 + delta * s0,
+            s2 + 2 * delta * s1 + delta**2 * s0,
+            s3 + 3 * delta * s2 + 3 * delta**2 * s1 + delta**3 * s0,
+            s4 + 4 * delta * s3 + 6 * delta**2 * s2 + 4 * delta**3 * s1 + delta**4 * s0)
+
+
+class QuantileSketch(object):
+    """
+    Mergeable sketch of the distribution of weighted values with a bounded number of centroids, a
+    t-digest with the scale function k(q) = compression / (2 pi) * arcsin(2q - 1). Values are added
+    chunk by chunk with update, sketches of different parts of the data, e.g. computed in parallel
+    processes, are combined with merge or +.
+
+    Adjacent sorted centroids are merged as long as they stay within one unit of k, so the sketch holds
+    at most about compression / 2 centroids. The centroids near the tails are small, so the error of the
+    CDF is smallest for extreme quantiles. The error of the CDF is of the order of 1 / compression in
+    the centre of the distribution, see benchmarks/bench_sketch.py.
+
+    :param compression: accuracy parameter, the number of centroids is about compression / 2
+    :type compression: float
+
+    :param buffer_size: number of values that are collected before they are merged into the centroids
+    :type buffer_size: int
+    """
+    def __init__(self, compression=200., buffer_size=10000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.min = np.inf
+        self.max = -np.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def __add__(self, other):
+        result = copy.deepcopy(self)
+        return result.merge(other)
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        """
+        Number of centroids.
+        """
+        self._compress()
+        return len(self._means)
+
+    @property
+    def sum_weights(self):
+        self._compress()
+        return self._weights.sum()
+
+    def update(self, values, weights=None):
+        """
+        Add values to the sketch. Values that are NaN are ignored.
+
+        :param values: values
+        :type values: numpy.ndarray, pandas.Series
+
+        :param weights: (optional) weight of each value, must not be negative
+        :type weights: numpy.ndarray, pandas.Series
+
+        :return: self
+        :rtype: QuantileSketch
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        if weights is None:
+            weights = np.ones(len(values))
+        else:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            if len(weights) != len(values):
+                raise ValueError('values and weights must have same length.')
+            if (weights < 0).any():
+                raise ValueError('weights must not be negative.')
+
+        valid = ~np.isnan(values) & (weights > 0)
+        if not valid.all():
+            values, weights = values[valid], weights[valid]
+
+        if len(values) == 0:
+            return self
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        self._buffer.append((values, weights))
+        self._buffered += len(values)
+
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+        return self
+
+    def merge(self, other):
+        """
+        Add the values of another sketch.
+
+        :param other: sketch of other values
+        :type other: QuantileSketch
+
+        :return: self
+        :rtype: QuantileSketch
+        """
+        other._compress()
+
+        if len(other._means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._buffer.append((other._means, other._weights))
+            self._buffered += len(other._means)
+            self._compress()
+
+        return self
+
+    def cdf(self, x):
+        """
+        Evaluate the CDF at many points at once.
+
+        :param x: points at which the CDF is evaluated
+        :type x: float, numpy.ndarray
+
+        :return: CDF at x
+        :rtype: float, numpy.ndarray
+        """
+        points, probabilities = self._cdf_points()
+        return np.interp(np.asarray(x, dtype=np.float64), points, probabilities, left=0., right=1.)[()]
+
+    def quantile(self, quantiles):
+        """
+        Evaluate the (weighted) quantiles, the inverse of the CDF.
+
+        :param quantiles: quantiles between 0 and 1
+        :type quantiles: float, numpy.ndarray
+
+        :return: values of the quantiles
+        :rtype: float, numpy.ndarray
+        """
+        points, probabilities = self._cdf_points()
+        return np.interp(np.asarray(quantiles, dtype=np.float64), probabilities, points)[()]
+
+    def ecdf(self):
+        """
+        Get the CDF at the centroids like ecdf_of_series. It can be evaluated with evaluate_ecdf and
+        inverse_ecdf with interpolate=True.
+
+        :return: CDF
+        :rtype: pandas.Series
+        """
+        import pandas as pd
+
+        points, probabilities = self._cdf_points()
+        return pd.Series(probabilities, index=points)
+
+    def _cdf_points(self):
+        """
+        The CDF is interpolated linearly between the centres of the centroids, the minimum and the maximum.
+        """
+        self._compress()
+
+        if len(self._means) == 0:
+            return np.array([np.nan]), np.array([np.nan])
+
+        total = self._weights.sum()
+        centres = (np.cumsum(self._weights) - 0.5 * self._weights) / total
+
+        return (np.concatenate(([self.min], self._means, [self.max])),
+                np.concatenate(([0.], centres, [1.])))
+
+    def _compress(self):
+        if not self._buffer:
+            return
+
+        means = np.concatenate([self._means] + [values for values, weights in self._buffer])
+        weights = np.concatenate([self._weights] + [weights for values, weights in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+
+        cumulative_weights = np.cumsum(weights)
+        centres = (cumulative_weights - 0.5 * weights) / cumulative_weights[-1]
+
+        scale = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * centres - 1, -1, 1))
+        groups = np.floor(scale + self.compression / 4.)
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1))
+
+        self._weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(weights * means, starts) / self._weights
+
+
 def weighted_mean(series, weights=None):
     """
     Calculate the weighted mean of a series.
@@ -11,7 +428,7 @@ def weighted_mean(series, weights=None):
     :param series: calculate mean of this series
     :type series: pandas.Series
 
-    :param weights: (optional) series with weights.
+    :param weights: (optional) series with weights, aligned to series by index.
     :type weights: pandas.Series
 
     :return: mean of the series
@@ -20,10 +437,9 @@ def weighted_mean(series, weights=None):
     if weights is None:
         return series.mean()
 
-    if len(weights) != len(series):
-        raise ValueError('series and weights must have same length.')
+    series, weights = _align(series, weights)
 
-    return np.sum(weights * series) / np.sum(weights)
+    return weighted_moments(series, weights).mean
 
 
 def weighted_std(series, weights=None):
@@ -33,7 +449,7 @@ def weighted_std(series, weights=None):
     :param series: calculate std of this series
     :type series: pandas.Series
 
-    :param weights: (optional) use these weights
+    :param weights: (optional) use these weights, aligned to series by index.
     :type weights: pandas.Series
 
     :return: weighted std
@@ -42,23 +458,273 @@ def weighted_std(series, weights=None):
     if weights is None:
         return series.std()
 
+    series, weights = _align(series, weights)
+
+    moments = weighted_moments(series, weights)
+
+    if moments.sum_weights == 0:
+        return 0
+
+    return moments.std
+
+
+def _align(series, weights):
+    """
+    Align weights to the index of series, if both are pandas objects, like in pandas arithmetic.
+    """
     if len(weights) != len(series):
         raise ValueError('series and weights must have same length.')
 
-    s0 = np.sum(weights)
+    if hasattr(series, 'align') and hasattr(weights, 'align'):
+        return series.align(weights, join='inner')
 
-    if s0 == 0:
-        return 0
+    return series, weights
+
+
+def weighted_mean_of_frame(frame, columns=None, weight_column=None, by=None):
+    """
+    Calculate the weighted mean of many columns at once, optionally per group. The sums of all columns
+    and groups are calculated with one bincount over the group codes.
+
+    :param frame: data
+    :type frame: pandas.DataFrame
+
+    :param columns: (optional) Column names in frame. Default: all numeric columns.
+    :type columns: list
+
+    :param weight_column: (optional) use values of the column as weights
+    :type weight_column: str
+
+    :param by: (optional) column names or keys of DataFrame.groupby
+    :type by: str, list
+
+    :return: mean per column or DataFrame with the mean per group and column. Groups without values, e.g.
+        unobserved categories of a categorical key, are NaN.
+    :rtype: pandas.Series, pandas.DataFrame
+    """
+    return _weighted_frame_stat(_mean_of_groups, frame, columns, weight_column, by)
+
+
+def weighted_std_of_frame(frame, columns=None, weight_column=None, by=None):
+    """
+    Calculate the weighted standard deviation of many columns at once, optionally per group, like
+    weighted_std. The sums of all columns and groups are calculated with bincounts over the group codes.
+
+    :param frame: data
+    :type frame: pandas.DataFrame
+
+    :param columns: (optional) Column names in frame. Default: all numeric columns.
+    :type columns: list
+
+    :param weight_column: (optional) use values of the column as weights
+    :type weight_column: str
+
+    :param by: (optional) column names or keys of DataFrame.groupby
+    :type by: str, list
+
+    :return: std per column or DataFrame with the std per group and column. Groups without values, e.g.
+        unobserved categories of a categorical key, are NaN.
+    :rtype: pandas.Series, pandas.DataFrame
+    """
+    return _weighted_frame_stat(_std_of_groups, frame, columns, weight_column, by)
+
+
+def weighted_quantiles_of_frame(frame, quantiles, columns=None, weight_column=None, by=None):
+    """
+    Calculate weighted quantiles of many columns at once, optionally per group. The quantile q is the
+    smallest value x with CDF(x) >= q of the empirical CDF, see ecdf_of_series. The values of each column
+    are sorted once by group and value. The weights must not be negative.
+
+    :param frame: data
+    :type frame: pandas.DataFrame
+
+    :param quantiles: quantiles between 0 and 1
+    :type quantiles: list, float
+
+    :param columns: (optional) Column names in frame. Default: all numeric columns.
+    :type columns: list
+
+    :param weight_column: (optional) use values of the column as weights
+    :type weight_column: str
+
+    :param by: (optional) column names or keys of DataFrame.groupby
+    :type by: str, list
+
+    :return: DataFrame with the quantiles (per group) as index and the columns. Groups without values,
+        e.g. unobserved categories of a categorical key, are NaN.
+    :rtype: pandas.DataFrame
+    """
+    grouped = None if by is None else frame.groupby(by)
+    return _weighted_quantiles(frame, quantiles, columns, weight_column, grouped)
+
+
+def grouped_weighted_mean(self, columns=None, weight_column=None):
+    """
+    Calculate the weighted mean of many columns per group, see weighted_mean_of_frame. Default columns
+    are the selected columns of the groupby.
+    """
+    return _weighted_frame_stat(_mean_of_groups, self.obj, columns, weight_column, grouped=self)
+
+
+def grouped_weighted_std(self, columns=None, weight_column=None):
+    """
+    Calculate the weighted standard deviation of many columns per group, see weighted_std_of_frame.
+    Default columns are the selected columns of the groupby.
+    """
+    return _weighted_frame_stat(_std_of_groups, self.obj, columns, weight_column, grouped=self)
+
+
+def grouped_weighted_quantiles(self, quantiles, columns=None, weight_column=None):
+    """
+    Calculate weighted quantiles of many columns per group, see weighted_quantiles_of_frame. Default
+    columns are the selected columns of the groupby.
+    """
+    return _weighted_quantiles(self.obj, quantiles, columns, weight_column, self)
+
+
+def _weighted_frame_stat(group_stat, frame, columns, weight_column, by=None, grouped=None):
+    import pandas as pd
+
+    if grouped is None and by is not None:
+        grouped = frame.groupby(by)
+
+    columns, values, weights = _frame_arrays(frame, columns, weight_column, grouped)
+    codes, index = _group_codes(grouped, len(frame))
+
+    stat = group_stat(values, weights, codes, 1 if index is None else len(index))
+
+    if index is None:
+        return pd.Series(stat[0], index=columns)
+
+    return pd.DataFrame(stat, index=index, columns=columns)
+
+
+def _weighted_quantiles(frame, quantiles, columns, weight_column, grouped):
+    import pandas as pd
+
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=np.float64))
+    if ((quantiles < 0) | (quantiles > 1)).any():
+        raise ValueError('quantiles must be between 0 and 1.')
+
+    columns, values, weights = _frame_arrays(frame, columns, weight_column, grouped)
+    codes, index = _group_codes(grouped, len(frame))
+    n_groups = 1 if index is None else len(index)
+
+    result = np.full((n_groups, len(quantiles), len(columns)), np.nan)
+
+    for column in range(len(columns)):
+        valid = (codes >= 0) & ~np.isnan(values[:, column])
+        column_values = values[valid, column]
+        column_codes = codes[valid]
+
+        order = np.lexsort((column_values, column_codes))
+        cumulative_weights = np.cumsum(weights[valid][order])
+
+        counts = np.bincount(column_codes, minlength=n_groups)
+        stops = np.cumsum(counts)
+        starts = stops - counts
+        offsets = np.concatenate(([0.], cumulative_weights))[starts]
+        totals = np.concatenate(([0.], cumulative_weights))[stops] - offsets
+
+        targets = offsets[:, np.newaxis] + quantiles[np.newaxis, :] * totals[:, np.newaxis]
+        positions = np.searchsorted(cumulative_weights, targets, side='left')
+        positions = np.clip(positions, starts[:, np.newaxis], np.maximum(stops - 1, starts)[:, np.newaxis])
+
+        sorted_values = column_values[order]
+        has_entries = (counts > 0) & (totals > 0)
+        result[has_entries, :, column] = sorted_values[positions[has_entries]]
+
+    if index is None:
+        return pd.DataFrame(result[0], index=pd.Index(quantiles, name='quantile'), columns=columns)
+
+    keys = [key if isinstance(key, tuple) else (key,) for key in index]
+    result_index = pd.MultiIndex.from_tuples([key + (quantile,) for key in keys for quantile in quantiles],
+                                             names=list(index.names) + ['quantile'])
+
+    return pd.DataFrame(result.reshape(-1, len(columns)), index=result_index, columns=columns)
+
+
+def _frame_arrays(frame, columns, weight_column, grouped):
+    """
+    Get the values of the columns as one 2D array and the weights. The default columns of a groupby with
+    a column selection, e.g. frame.groupby(key)[columns], are the selected columns.
+    """
+    selection = getattr(grouped, '_selection', None)
+    if columns is None and selection is not None:
+        columns = selection
+
+    if columns is None:
+        keys = getattr(grouped, 'keys', None)
+        keys = keys if isinstance(keys, list) else [keys]
+        excluded = set(key for key in keys if isinstance(key, (str, type(u''))))
+        excluded.add(weight_column)
+        columns = [column for column in frame.select_dtypes(include=[np.number]).columns
+                   if column not in excluded]
+    elif isinstance(columns, (str, type(u''))):
+        columns = [columns]
+    else:
+        columns = list(columns)
+
+    values = np.asarray(frame[columns].values, dtype=np.float64)
+
+    if weight_column is None:
+        weights = np.ones(len(frame))
+    else:
+        weights = np.asarray(frame[weight_column].values, dtype=np.float64)
+
+    return columns, values, weights
+
+
+def _group_codes(grouped, n_rows):
+    """
+    Get the group code of each row and the keys of the groups. Rows with the code -1 are in no group.
+    """
+    if grouped is None:
+        return np.zeros(n_rows, dtype=np.intp), None
+
+    return np.asarray(grouped.ngroup().values, dtype=np.intp), grouped.size().index
+
+
+def _sum_per_group(array, codes, n_groups):
+    """
+    Sum the columns of a 2D array per group with one bincount.
+    """
+    n_columns = array.shape[1]
+    valid = codes >= 0
+
+    bins = (codes[valid, np.newaxis] * n_columns + np.arange(n_columns)).ravel()
+
+    return np.bincount(bins, weights=array[valid].ravel(), minlength=n_groups * n_columns).reshape(n_groups, -1)
+
+
+def _masked_weights(values, weights):
+    missing = np.isnan(values)
+    return np.where(missing, 0., weights[:, np.newaxis]), np.where(missing, 0., values)
+
+
+def _mean_of_groups(values, weights, codes, n_groups):
+    weights, values = _masked_weights(values, weights)
 
-    s1 = np.sum(weights * series)
-    s2 = np.sum(weights * series * series)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _sum_per_group(weights * values, codes, n_groups) / _sum_per_group(weights, codes, n_groups)
 
-    return np.sqrt((s2 / s0 - s1**2/s0**2))
 
+def _std_of_groups(values, weights, codes, n_groups):
+    counts = _sum_per_group((~np.isnan(values)).astype(np.float64), codes, n_groups)
+    weights, values = _masked_weights(values, weights)
+    sum_weights = _sum_per_group(weights, codes, n_groups)
 
-def ecdf_of_column(frame, column, weight_column=None):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = _sum_per_group(weights * values, codes, n_groups) / sum_weights
+        deltas = values - means[np.maximum(codes, 0)]
+        variance = _sum_per_group(weights * deltas * deltas, codes, n_groups) / sum_weights
+
+    return np.where(counts == 0, np.nan, np.where(sum_weights == 0, 0., np.sqrt(variance)))
+
+
+def ecdf_of_column(frame, column, weight_column=None, bins=None, x_limits=None):
     """
-    Calculate the empirical CDF of the values of column.
+    Calculate the empirical CDF of the values of column, see ecdf_of_series.
 
     :param frame: data
     :type frame: pandas.DataFrame
@@ -69,24 +735,28 @@ def ecdf_of_column(frame, column, weight_column=None):
     :param weight_column: (optional) use values of the column as weights
     :type weight_column: str
 
+    :param bins: (optional) number of bins of the approximate CDF
+    :type bins: int
+
+    :param x_limits: (optional) limits of the bins. Default: minimum and maximum of the values.
+    :type x_limits: tuple
+
     :return: Empirical CDF
     :rtype: pandas.Series
     """
-    if weight_column is None:
-        counts = frame[column].value_counts(normalize=True)
-    else:
-        counts = frame.groupby(column)[weight_column].sum()/frame[weight_column].sum()
-    rv = counts.sort_index().cumsum()
+    weights = None if weight_column is None else frame[weight_column]
 
-    rv.name = 'CDF_{}'.format(column)
-    rv.index.name = None
-
-    return rv
+    return _ecdf(frame[column], weights, 'CDF_{}'.format(column), bins, x_limits)
 
 
-def ecdf_of_series(self, weights=None):
+def ecdf_of_series(self, weights=None, bins=None, x_limits=None):
     """
-    Calculate the empirical CDF of the values.
+    Calculate the empirical CDF of the values. The values are sorted once and the CDF is the cumulative
+    sum of the sorted weights at the last entry of every unique value. NaN values are ignored.
+
+    If bins is given, the CDF is approximated by filling a Histogram with bins equidistant bins. The
+    result has the bin edges as index, so its size does not depend on the number of values, and it can
+    be interpolated linearly between the edges.
 
     :param self:
     :type self: pandas.Series
@@ -94,23 +764,134 @@ def ecdf_of_series(self, weights=None):
     :param weights: (optional) events weights
     :type weights: pandas.Series
 
-    :return: CDF
+    :param bins: (optional) number of bins of the approximate CDF
+    :type bins: int
+
+    :param x_limits: (optional) limits of the bins. Default: minimum and maximum of the values.
+    :type x_limits: tuple
+
+    :return: CDF with the values or bin edges as index
     :rtype: pandas.Series
     """
-    if weights is None:
-        counts = self.value_counts(normalize=True)
-    else:
-        if len(weights) != len(self):
-            raise ValueError('series and weights must have same length.')
+    if weights is not None and len(weights) != len(self):
+        raise ValueError('series and weights must have same length.')
+
+    return _ecdf(self, weights, 'CDF_{}'.format(self.name) if self.name is not None else None, bins, x_limits)
+
+
+def evaluate_ecdf(ecdf, x, interpolate=False):
+    """
+    Evaluate an empirical CDF of ecdf_of_series at many points at once.
+
+    :param ecdf: CDF with the values as index
+    :type ecdf: pandas.Series
 
-        frame = pd.DataFrame(dict(values=self, weights=weights))
+    :param x: points at which the CDF is evaluated
+    :type x: float, numpy.ndarray
 
-        counts = frame.groupby('values')['weights'].sum()/frame['weights'].sum()
+    :param interpolate: If True, the CDF is interpolated linearly between its points, e.g. for the
+        approximate CDF. Otherwise it is a step function.
+    :type interpolate: bool
 
-    rv = counts.sort_index().cumsum()
-    rv.name = 'CDF_{}'.format(self.name) if self.name is not None else None
+    :return: CDF at x
+    :rtype: float, numpy.ndarray
+    """
+    points = ecdf.index.values
+    probabilities = ecdf.values
+    x = np.asarray(x)
+
+    if interpolate:
+        return np.interp(x, points, probabilities, left=0., right=1.)[()]
+
+    positions = np.searchsorted(points, x, side='right') - 1
+
+    return np.where(positions >= 0, probabilities[np.maximum(positions, 0)], 0.)[()]
+
+
+def inverse_ecdf(ecdf, quantiles, interpolate=False):
+    """
+    Evaluate the inverse of an empirical CDF of ecdf_of_series, i.e. the smallest value x with
+    CDF(x) >= q of each quantile q.
+
+    :param ecdf: CDF with the values as index
+    :type ecdf: pandas.Series
+
+    :param quantiles: quantiles between 0 and 1
+    :type quantiles: float, numpy.ndarray
+
+    :param interpolate: If True, the CDF is interpolated linearly between its points, e.g. for the
+        approximate CDF. Otherwise it is a step function.
+    :type interpolate: bool
+
+    :return: values of the quantiles
+    :rtype: float, numpy.ndarray
+    """
+    points = ecdf.index.values
+    probabilities = ecdf.values
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    if interpolate:
+        return np.interp(quantiles, probabilities, points)[()]
+
+    positions = np.searchsorted(probabilities, quantiles, side='left')
+
+    return points[np.minimum(positions, len(points) - 1)][()]
+
+
+def _ecdf(values, weights, name, bins=None, x_limits=None):
+    values = np.asarray(values)
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    if values.dtype.kind in 'fc':
+        valid = ~np.isnan(values)
+        if not valid.all():
+            values = values[valid]
+            weights = None if weights is None else weights[valid]
+
+    if bins is None:
+        rv = _exact_ecdf(values, weights)
+    else:
+        rv = _binned_ecdf(values, weights, bins, x_limits)
+
+    rv.name = name
     rv.index.name = None
 
     return rv
 
 
+def _exact_ecdf(values, weights):
+    import pandas as pd
+
+    if len(values) == 0:
+        return pd.Series([], dtype=np.float64)
+
+    order = np.argsort(values)
+    sorted_values = values[order]
+
+    if weights is None:
+        cumulative_weights = np.arange(1., len(values) + 1.)
+    else:
+        cumulative_weights = np.cumsum(weights[order])
+
+    last = np.append(np.flatnonzero(sorted_values[1:] != sorted_values[:-1]), len(values) - 1)
+
+    return pd.Series(cumulative_weights[last] / cumulative_weights[-1], index=sorted_values[last])
+
+
+def _binned_ecdf(values, weights, bins, x_limits):
+    import pandas as pd
+    from .histogram import Histogram
+
+    if x_limits is None:
+        x_limits = (values.min(), values.max()) if len(values) else (0., 1.)
+        if x_limits[0] == x_limits[1]:
+            x_limits = (x_limits[0] - 0.5, x_limits[1] + 0.5)
+
+    hist = Histogram('cdf', bins, x_limits)
+    hist.fill(values, weights)
+
+    cumulative_weights = np.cumsum(np.concatenate(([hist.underflow], hist.bin_content)))
+    total = cumulative_weights[-1] + hist.overflow
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.Series(cumulative_weights / total, index=hist.bins)
@@ -67,4 +67,150 @@ class TestConversion(TestCase):
         self.assertListEqual(get_leaf_names(result_tree_2), ['a', 'b'])
 
         self.assertRaises(KeyError, conversion.convert_data_frame_to_ttree, data_frame,
-                          'test_tree_3', columns=['d', 'f'])
\ No newline at end of file
+                          'test_tree_3', columns=['d', 'f'])
+
+    def test_convert_data_frame_to_ttree_in_chunks(self):
+        import numpy as np
+
+        data_frame = pd.DataFrame({'a': np.arange(25.), 'b': np.arange(25) * 2})
+
+        tree = conversion.convert_data_frame_to_ttree(data_frame, 'test_tree', chunk_size=7)
+        self.assertEqual(tree.GetEntries(), 25)
+
+        converted = conversion.convert_ttree_to_data_frame(tree, chunk_size=4)
+        self.assertListEqual(converted['a'].tolist(), data_frame['a'].tolist())
+        self.assertListEqual(converted['b'].tolist(), data_frame['b'].tolist())
+
+        selected = conversion.convert_ttree_to_data_frame(tree, chunk_size=4, selection='b > 30')
+        self.assertListEqual(selected['a'].tolist(), list(range(16, 25)))
+
+    def test_iterate_ttree_as_data_frames(self):
+        from root_numpy import array2tree
+        import numpy as np
+
+        array = np.zeros(25, dtype=[('var1', 'f8'), ('var2', 'f8'), ('var3', 'i4')])
+        array['var1'] = np.arange(25)
+        test_tree = array2tree(array, 'test_tree')
+
+        chunks = list(conversion.iterate_ttree_as_data_frames(test_tree, ['var1', 'var3'], chunk_size=10))
+
+        self.assertListEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        self.assertListEqual(chunks[0].columns.get_values().tolist(), ['var1', 'var3'])
+        self.assertListEqual(pd.concat(chunks)['var1'].tolist(), list(range(25)))
+
+        selected = list(conversion.iterate_ttree_as_data_frames(test_tree, chunk_size=10, selection='var1 > 12'))
+        self.assertListEqual([len(chunk) for chunk in selected], [0, 7, 5])
+
+        shard = list(conversion.iterate_ttree_as_data_frames(test_tree, chunk_size=10, start=5, stop=20))
+        self.assertListEqual([len(chunk) for chunk in shard], [10, 5])
+        self.assertListEqual(pd.concat(shard)['var1'].tolist(), list(range(5, 20)))
+
+    def test_convert_ttree_to_columns(self):
+        from root_numpy import array2tree
+        import numpy as np
+
+        array = np.zeros(25, dtype=[('var1', 'f8'), ('var2', 'i4'), ('var3', 'f8')])
+        array['var1'] = np.arange(25)
+        array['var2'] = np.arange(25) * 2
+        test_tree = array2tree(array, 'test_tree')
+
+        columns = conversion.convert_ttree_to_columns(test_tree, chunk_size=10, selection='var1 < 12')
+
+        self.assertListEqual(list(columns), ['var1', 'var2', 'var3'])
+        self.assertTrue(all(column.flags.c_contiguous for column in columns.values()))
+        self.assertListEqual(columns['var2'].tolist(), list(range(0, 24, 2)))
+
+        data_frame = conversion.convert_ttree_to_data_frame(test_tree, chunk_size=10)
+        self.assertListEqual(data_frame.columns.get_values().tolist(), ['var1', 'var2', 'var3'])
+        self.assertListEqual(data_frame['var2'].tolist(), list(range(0, 50, 2)))
+
+        chunks = [array[:10], array[10:]]
+        data_frame = conversion._data_frame_from_chunks(chunks, 12)
+        self.assertListEqual(data_frame['var2'].tolist(), list(range(0, 50, 2)))
+
+        blocks = conversion._allocate_blocks([('var1', 'f8')], 1000)
+        blocks[0][1][:] = 1.
+        small = conversion._data_frame_from_blocks(blocks, [('var1', 'f8')], 10)
+        self.assertListEqual(small['var1'].tolist(), [1.] * 10)
+        self.assertFalse(np.shares_memory(small['var1'].values, blocks[0][1]))
+
+        empty = conversion._data_frame_from_chunks([{}] * 2, 5, [])
+        self.assertTupleEqual(empty.shape, (0, 0))
+        self.assertTupleEqual(conversion._data_frame_from_chunks([], 0, [('var1', 'f8')]).shape, (0, 1))
+
+    def test_conversion_cache(self):
+        from root_numpy import array2root
+        import numpy as np
+        import os
+        import shutil
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        try:
+            array = np.zeros(30, dtype=[('var1', 'f8'), ('var2', 'i4'), ('var3', 'f8')])
+            array['var1'] = np.arange(30)
+            array['var2'] = np.arange(30) * 2
+            file_name = os.path.join(directory, 'data.root')
+            array2root(array, file_name, treename='data')
+
+            cache = conversion.ConversionCache(os.path.join(directory, 'cache'), max_size=10**6)
+
+            data_frame = cache.convert(file_name, 'data', ['var2', 'var1'])
+            self.assertListEqual(data_frame.columns.get_values().tolist(), ['var2', 'var1'])
+            self.assertListEqual(data_frame['var2'].tolist(), list(range(0, 60, 2)))
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            data_frame = cache.convert(file_name, 'data', ['var1'])
+            self.assertListEqual(data_frame['var1'].tolist(), list(range(30)))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            data_frame = cache.convert(file_name, 'data')
+            self.assertTupleEqual(data_frame.shape, (30, 3))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+            selected = cache.convert(file_name, 'data', ['var1'], selection='var1 < 10')
+            self.assertEqual(len(selected), 10)
+            self.assertEqual(cache.stats['misses'], 3)
+
+            cache._max_size = 0
+            cache.convert(file_name, 'data', ['var1'])
+            self.assertEqual(cache.evictions, 1)
+
+            cache.clear()
+            self.assertEqual(cache.size(), 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_convert_files_to_data_frame(self):
+        from root_numpy import array2root
+        import numpy as np
+        import os
+        import shutil
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        try:
+            file_names = []
+            for index, size in enumerate([10, 0, 25, 7]):
+                array = np.zeros(size, dtype=[('var1', 'f8'), ('var2', 'i8' if index == 2 else 'i4'),
+                                              ('var3', 'f8')])
+                array['var2'] = index
+                array['var1'] = np.arange(size)
+                file_names.append(os.path.join(directory, 'data_{}.root'.format(index)))
+                array2root(array, file_names[-1], treename='data')
+
+            data_frame, report = conversion.convert_files_to_data_frame(file_names, 'data', ['var2', 'var1'],
+                                                                        processes=2, chunk_size=4)
+
+            self.assertTupleEqual(data_frame.shape, (42, 2))
+            self.assertListEqual(data_frame.columns.get_values().tolist(), ['var2', 'var1'])
+            self.assertListEqual(data_frame['var2'].tolist(), [0] * 10 + [2] * 25 + [3] * 7)
+            self.assertEqual(data_frame['var2'].dtype, np.int32)
+            self.assertListEqual(report['entries'].tolist(), [10, 0, 25, 7])
+            self.assertListEqual(report.index.tolist(), file_names)
+
+            selected, _ = conversion.convert_files_to_data_frame(os.path.join(directory, '*.root'), 'data',
+                                                                 selection='var1 < 5')
+            self.assertEqual(len(selected), 15)
+        finally:
+            shutil.rmtree(directory)
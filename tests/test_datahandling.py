@@ -10,6 +10,10 @@ from root_numpy import array2root
 __author__ = 'Michael Ziegler'
 
 
+def _count_shard_entries(tree, start, stop):
+    return min(stop, tree.GetEntries()) - start
+
+
 class TestDataHandling(TestCase):
     def _create_root_file(self, file_name='data.root', tree_name='data'):
         location = os.path.join(os.getcwd(), os.path.dirname(inspect.getfile(inspect.currentframe())))
@@ -117,4 +121,144 @@ test5: 0
         self.assertEqual(bool_section0['test2'], True)
         self.assertEqual(bool_section1['test3'], False)
         self.assertEqual(bool_section1['test4'], True)
-        self.assertEqual(bool_section1['test5'], False)
\ No newline at end of file
+        self.assertEqual(bool_section1['test5'], False)
+
+    def test_load_config(self):
+        config_file_name = self._create_config_file('typed.config')
+        schema = {'var1': float, 'test0': bool, 'test4': int, 'test5': [bool]}
+
+        config = datahandling.load_config(config_file_name, schema)
+        self.assertIs(datahandling.load_config(config_file_name, dict(schema)), config)
+        self.assertEqual(config['variables']['var1'], 0.1)
+        self.assertEqual(config['variables']['var2'], '0.1')
+        self.assertIs(config['boolSection']['test0'], True)
+        self.assertEqual(config['boolSection']['test4'], 1)
+        self.assertEqual(config['boolSection']['test5'], (False,))
+        with self.assertRaises(TypeError):
+            config['variables']['var1'] = 0.2
+
+        with open(config_file_name, 'a') as config_file:
+            config_file.write("[listSection]\nvalues: 1, 2.5,3\n")
+        self.assertEqual(datahandling.load_config(config_file_name, {'values': [float]})['listSection']['values'],
+                         (1., 2.5, 3.))
+        self.assertEqual(datahandling.load_config_section(config_file_name, 'listSection',
+                                                          schema={'values': list})['values'], ('1', '2.5', '3'))
+
+        self.assertRaises(ValueError, datahandling.load_config, config_file_name, {'var1': int})
+        self.assertRaises(IOError, datahandling.load_config, "DOES_NOT_EXIST")
+
+        self.assertEqual(datahandling.load_config_section(["DOES_NOT_EXIST", config_file_name], 'listSection',
+                                                          schema={'values': [float]}),
+                         datahandling.load_config(config_file_name, {'values': [float]})['listSection'])
+        self.assertRaises(IOError, datahandling.load_config_section, ["DOES_NOT_EXIST"], 'listSection')
+        os.remove(config_file_name)
+
+    def test_csv_writer(self):
+        from StringIO import StringIO
+        import pandas as pd
+
+        csv_file = StringIO()
+        with datahandling.CsvWriter(csv_file, precision=4, buffer_rows=3) as writer:
+            writer.write_row(['x', 'y'])
+            self.assertEqual(csv_file.getvalue(), "")
+            writer.write_rows(np.arange(8.).reshape(4, 2) / 3)
+            writer.write_rows(pd.DataFrame({'x': [1], 'y': ['a']}))
+            self.assertEqual(csv_file.getvalue().count("\n"), 4)
+            writer.write_row([2, 'b'])
+
+        self.assertEqual(csv_file.getvalue(),
+                         "x,y\n0,0.3333\n0.6667,1\n1.333,1.667\n2,2.333\n1,a\n2,b\n")
+
+        csv_file = StringIO()
+        with datahandling.CsvWriter(csv_file, separator="%") as writer:
+            writer.write_rows(np.arange(4).reshape(2, 2))
+        self.assertEqual(csv_file.getvalue(), "0%1\n2%3\n")
+
+    def test_file_pool(self):
+        root_file, tree_name, entries = self._create_root_file()
+
+        pool = datahandling.TFilePool(max_open=1)
+        first_file = pool.open(root_file)
+        self.assertIs(pool.open(root_file), first_file)
+
+        first_file.Close()
+        reopened_file = pool.open(root_file)
+        self.assertTrue(reopened_file.IsOpen())
+
+        other_file = self._create_root_file('data_2.root')[0]
+        pool.open(other_file)
+        self.assertEqual(len(pool), 1)
+        self.assertFalse(reopened_file.IsOpen())
+
+        self.assertRaises(IOError, pool.open, "abcdef")
+
+        inherited_file = pool.open(other_file)
+        pool._pid = -1
+        self.assertEqual(len(pool), 0)
+        self.assertIsNot(pool.open(other_file), inherited_file)
+
+        pool_file = pool.open(other_file)
+        pool.clear()
+        self.assertEqual(len(pool), 0)
+        self.assertFalse(pool_file.IsOpen())
+
+        test_trees, input_file = datahandling.load_trees_from_file(root_file)
+        self.assertIs(datahandling.load_tree_from_file(root_file, tree_name)[1], input_file)
+        self.assertListEqual(list(test_trees), [tree_name])
+        self.assertRaises(KeyError, test_trees.__getitem__, 'wrongName')
+
+    def test_build_file_index(self):
+        root_file, tree_name, entries = self._create_root_file()
+        other_file = self._create_root_file('data_2.root')[0]
+        location = os.path.dirname(root_file)
+        index_file = os.path.join(location, 'index.json')
+
+        index, n_scanned = datahandling.build_file_index([root_file, other_file], index_file)
+        self.assertEqual(n_scanned, 2)
+
+        file_info = index[os.path.abspath(root_file)]
+        self.assertEqual(file_info['size'], os.path.getsize(root_file))
+        self.assertEqual(file_info['trees'][tree_name]['entries'], entries)
+        self.assertListEqual(file_info['trees'][tree_name]['branches'], ['var1', 'var2', 'var3', 'var4', 'var5'])
+
+        self.assertEqual(datahandling.build_file_index([root_file, other_file], index_file)[1], 0)
+
+        chain, added_files = datahandling.load_chain_from_index(index_file, tree_name, [root_file])
+        self.assertIsInstance(chain, TChain)
+        self.assertEqual(added_files, 1)
+        self.assertEqual(entries, chain.GetEntries())
+
+        self.assertEqual(datahandling.load_chain_from_index(index, tree_name)[1], 2)
+        self.assertRaises(IOError, datahandling.load_chain_from_index, index, 'wrongName', [root_file])
+
+        os.remove(index_file)
+
+    def test_plan_shards(self):
+        root_file, tree_name, entries = self._create_root_file()
+        other_file = self._create_root_file('data_2.root')[0]
+
+        shards = datahandling.plan_shards([root_file, other_file], tree_name, entries_per_shard=30)
+        self.assertListEqual([shard.stop - shard.start for shard in shards], [25] * 8)
+        self.assertEqual(shards[0], (root_file, 0, 25))
+        self.assertEqual(shards[-1], (other_file, 75, 100))
+
+        chain = datahandling.load_chain_from_files([root_file, other_file], tree_name)[0]
+        self.assertListEqual(datahandling.plan_shards(chain, entries_per_shard=30), shards)
+
+        size = os.path.getsize(root_file)
+        self.assertEqual(len(datahandling.plan_shards([root_file], tree_name, bytes_per_shard=size)), 1)
+        by_size = datahandling.plan_shards([root_file], tree_name, bytes_per_shard=size // 10)
+        self.assertTrue(all(shard.stop - shard.start <= 10 for shard in by_size))
+        self.assertEqual(by_size[-1].stop, entries)
+
+        self.assertRaises(ValueError, datahandling.plan_shards, [root_file], tree_name)
+        self.assertRaises(ValueError, datahandling.plan_shards, [root_file], None, entries_per_shard=30)
+
+    def test_run_shards(self):
+        root_file, tree_name, entries = self._create_root_file()
+        other_file = self._create_root_file('data_2.root')[0]
+
+        shards = datahandling.plan_shards([root_file, other_file], tree_name, entries_per_shard=40)
+        self.assertEqual(datahandling.run_shards(_count_shard_entries, shards, tree_name, processes=2),
+                         2 * entries)
+        self.assertIsNone(datahandling.run_shards(_count_shard_entries, [], tree_name))
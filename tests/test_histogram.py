@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+from unittest import TestCase, skipIf
+import os
+import shutil
+import tempfile
+from ekpytools.histogram import Histogram, HistogramND, HistogramBank
+from ekpytools import histogram
+import numpy as np
+import pandas as pd
+
+__author__ = 'Michael Ziegler'
+
+
+def _root_available():
+    try:
+        import ROOT
+        import root_numpy
+    except ImportError:
+        return False
+    return True
+
+
+class TestHistogram(TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(42)
+        self.values = random_state.normal(5, 2, 10000)
+        self.weights = random_state.uniform(0, 2, 10000)
+
+    def test_fill(self):
+        hist = Histogram('test', 20, (0, 10))
+        hist.fill(self.values)
+
+        expected, _ = np.histogram(self.values, bins=20, range=(0, 10))
+
+        np.testing.assert_array_equal(hist.bin_content, expected)
+        np.testing.assert_array_equal(hist.bin_error, np.sqrt(expected))
+
+        self.assertRaises(ValueError, hist.fill, self.values, self.weights[:10])
+
+    def test_fill_weighted(self):
+        hist = Histogram('test', 20, (0, 10))
+        hist.fill(pd.Series(self.values), pd.Series(self.weights))
+
+        expected, _ = np.histogram(self.values, bins=20, range=(0, 10), weights=self.weights)
+        expected_sq, _ = np.histogram(self.values, bins=20, range=(0, 10), weights=self.weights**2)
+
+        np.testing.assert_allclose(hist.bin_content, expected)
+        np.testing.assert_allclose(hist.bin_error, np.sqrt(expected_sq))
+
+    def test_fill_normed(self):
+        expected, _ = np.histogram(self.values, bins=20, range=(0, 10), density=True)
+
+        hist = Histogram('test', 20, (0, 10), normed=True)
+        hist.fill(self.values)
+        np.testing.assert_allclose(hist.bin_content, expected)
+
+        expected, _ = np.histogram(self.values, bins=20, range=(0, 10), weights=self.weights, density=True)
+
+        weighted_hist = Histogram('test', 20, (0, 10), normed=True)
+        weighted_hist.fill(self.values, self.weights)
+        np.testing.assert_allclose(weighted_hist.bin_content, expected)
+
+    def test_fill_log(self):
+        hist = Histogram('test', 10, (0.1, 100.), log=True)
+        values = np.abs(self.values) * 10
+        hist.fill(values, self.weights)
+
+        expected, _ = np.histogram(values, bins=hist.bins, weights=self.weights)
+
+        np.testing.assert_allclose(hist.bin_content, expected)
+
+    def test_fill_edges(self):
+        hist = Histogram('test', 2, (0, 1))
+        hist.fill(np.array([-0.1, 0., 0.5, 1., 1.1]))
+
+        np.testing.assert_array_equal(hist.bin_content, [1, 2])
+        np.testing.assert_allclose(hist.bin_error**2, [1, 2])
+
+    def test_fill_from_iter(self):
+        hist = Histogram('test', 20, (0, 10))
+        hist.fill(self.values, self.weights)
+
+        chunk_size = 777
+        chunks = ((self.values[start:start + chunk_size], self.weights[start:start + chunk_size])
+                  for start in range(0, self.values.size, chunk_size))
+        streamed_hist = Histogram('test', 20, (0, 10)).fill_from_iter(chunks)
+
+        np.testing.assert_array_equal(hist.bin_content, streamed_hist.bin_content)
+        np.testing.assert_array_equal(hist.bin_error, streamed_hist.bin_error)
+
+        counted_hist = Histogram('test', 20, (0, 10)).fill_from_iter(np.array_split(self.values, 7))
+        expected, _ = np.histogram(self.values, bins=20, range=(0, 10))
+        np.testing.assert_array_equal(counted_hist.bin_content, expected)
+
+        self.assertRaises(ValueError, Histogram('test', 20, (0, 10), normed=True).fill_from_iter, [])
+
+    @skipIf(not _root_available(), 'ROOT and root_numpy are not installed')
+    def test_fill_from_tree(self):
+        from root_numpy import array2tree
+
+        array = np.empty(self.values.size, dtype=[('x', 'f8'), ('w', 'f8'), ('y', 'f8')])
+        array['x'] = self.values
+        array['w'] = self.weights
+        array['y'] = np.arange(self.values.size) % 7
+        tree = array2tree(array, 'data')
+
+        selected = array['y'] > 2
+        expected = Histogram('x', 20, (0, 10))
+        expected.fill(self.values[selected], self.weights[selected])
+
+        hist = Histogram('x', 20, (0, 10)).fill_from_tree(tree, 'x', weight_branch='w', chunk_size=777,
+                                                          selection='y > 2')
+        np.testing.assert_allclose(hist.bin_content, expected.bin_content)
+        np.testing.assert_allclose(hist.bin_error, expected.bin_error)
+        self.assertEqual(hist.underflow, expected.underflow)
+        self.assertEqual(hist.overflow, expected.overflow)
+
+        counted = Histogram('x', 20, (0, 10)).fill_from_tree(tree, 'x', chunk_size=777, start=100, stop=5000)
+        expected, _ = np.histogram(self.values[100:5000], bins=20, range=(0, 10))
+        np.testing.assert_array_equal(counted.bin_content, expected)
+
+    def test_under_and_overflow(self):
+        hist = Histogram('test', 2, (0, 1))
+        hist.fill(np.array([-0.1, -2., 0., 0.5, 1., 1.1, np.nan]))
+
+        np.testing.assert_array_equal(hist.bin_content, [1, 2])
+        self.assertEqual(hist.underflow, 2)
+        self.assertEqual(hist.overflow, 2)
+
+        log_hist = Histogram('test', 3, (1., 1000.), log=True)
+        log_hist.fill(np.array([-1., 0., 0.5, 1., 10., 999.9, 1000., 1001.]), np.full(8, 0.5))
+
+        np.testing.assert_array_equal(log_hist.bin_content, [0.5, 0.5, 1.])
+        self.assertEqual(log_hist.underflow, 1.5)
+        self.assertEqual(log_hist.overflow, 0.5)
+
+    def test_bin_indices_on_edges(self):
+        for log, limits in [(False, (-1.3, 2.7)), (True, (0.01, 470.))]:
+            hist = Histogram('test', 37, limits, log=log)
+            edges = hist.bins
+            values = np.concatenate((edges, np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf)))
+            hist.fill(values)
+
+            expected, _ = np.histogram(values, bins=edges)
+            np.testing.assert_array_equal(hist.bin_content, expected)
+            self.assertEqual(hist.underflow + hist.overflow + hist.bin_content.sum(), values.size)
+
+    def test_arithmetic(self):
+        hist = Histogram('a', 20, (0, 10))
+        hist.fill(self.values, self.weights)
+        other = Histogram('b', 20, (0, 10))
+        other.fill(self.values[::2])
+
+        hist_sum = hist + other
+        np.testing.assert_allclose(hist_sum.bin_content, hist.bin_content + other.bin_content)
+        np.testing.assert_allclose(hist_sum.bin_error, np.sqrt(hist.bin_error**2 + other.bin_error**2))
+        self.assertIs(hist_sum.bins, hist.bins)
+
+        difference = hist - other
+        np.testing.assert_allclose(difference.bin_content, hist.bin_content - other.bin_content)
+        np.testing.assert_allclose(difference.bin_error, hist_sum.bin_error)
+        np.testing.assert_array_equal((hist - hist).bin_error, 0)
+
+        negative = -hist
+        negative.bin_content *= 2
+        np.testing.assert_array_equal(negative.bin_content, -2 * hist.bin_content)
+        np.testing.assert_array_equal(negative.bin_error, hist.bin_error)
+
+        ratio = hist / other
+        expected_error = np.sqrt(hist.bin_error**2 / other.bin_content**2 +
+                                 other.bin_error**2 * hist.bin_content**2 / other.bin_content**4)
+        np.testing.assert_allclose(ratio.bin_content, hist.bin_content / other.bin_content)
+        np.testing.assert_allclose(ratio.bin_error, expected_error)
+
+        empty = Histogram('e', 20, (0, 10))
+        with np.errstate(all='raise'):
+            empty_ratio = empty / Histogram('f', 20, (0, 10))
+        self.assertTrue(np.isnan(empty_ratio.bin_content).all())
+        self.assertEqual(empty_ratio.underflow, 0)
+        self.assertEqual(empty_ratio.overflow, 0)
+
+        scaled = hist * 2.
+        np.testing.assert_allclose(scaled.bin_content, 2 * hist.bin_content)
+        np.testing.assert_allclose(scaled.bin_error, 2 * hist.bin_error)
+
+        self.assertRaises(ValueError, hist.__add__, Histogram('c', 20, (0, 11)))
+
+    def test_inplace_arithmetic(self):
+        hist = Histogram('a', 20, (0, 10))
+        hist.fill(self.values, self.weights)
+        other = Histogram('b', 20, (0, 10))
+        other.fill(self.values[::2])
+
+        expected = (hist + other - other) * 3. / other
+        bin_content = hist.bin_content
+        error_before = hist.bin_error
+
+        hist += other
+        hist -= other
+        hist *= 3.
+        hist /= other
+
+        self.assertIs(hist.bin_content.base, bin_content.base)
+        np.testing.assert_allclose(hist.bin_content, expected.bin_content)
+        np.testing.assert_allclose(hist.bin_error, expected.bin_error)
+        self.assertFalse(np.allclose(hist.bin_error, error_before))
+
+        self.assertIs(hist.bin_error, hist.bin_error)
+        self.assertRaises(ValueError, hist.bin_error.__setitem__, slice(None), 0)
+
+        hist -= hist
+        np.testing.assert_array_equal(hist.bin_content, 0)
+        np.testing.assert_array_equal(hist.bin_error, 0)
+
+    def test_fill_from_files(self):
+        from root_numpy import array2root
+        from ekpytools.histogram import fill_from_files
+        from ekpytools.datahandling import plan_shards
+
+        directory = tempfile.mkdtemp()
+        try:
+            file_names = []
+            for index, (values, weights) in enumerate(zip(np.array_split(self.values, 4),
+                                                          np.array_split(self.weights, 4))):
+                array = np.empty(values.size, dtype=[('x', 'f8'), ('w', 'f8')])
+                array['x'] = values
+                array['w'] = weights
+                file_names.append(os.path.join(directory, 'data_{}.root'.format(index)))
+                array2root(array, file_names[-1], treename='data')
+
+            histograms = {'x': Histogram('x', 20, (0, 10))}
+            serial = fill_from_files(histograms, file_names, 'data', weight_branch='w', processes=1)
+            parallel = fill_from_files(histograms, os.path.join(directory, '*.root'), 'data',
+                                       weight_branch='w', processes=2, chunk_size=1000)
+
+            hist = Histogram('x', 20, (0, 10))
+            hist.fill(self.values, self.weights)
+
+            np.testing.assert_allclose(serial['x'].bin_content, hist.bin_content)
+            np.testing.assert_allclose(serial['x'].bin_error, hist.bin_error)
+            np.testing.assert_allclose(parallel['x'].bin_content, serial['x'].bin_content)
+            self.assertEqual(histograms['x'].bin_content.sum(), 0)
+
+            shards = plan_shards(file_names, 'data', entries_per_shard=700)
+            sharded = histogram.fill_from_shards(histograms, shards, 'data', weight_branch='w',
+                                                 processes=2, chunk_size=300)
+            np.testing.assert_allclose(sharded['x'].bin_content, serial['x'].bin_content)
+            np.testing.assert_allclose(sharded['x'].bin_error, serial['x'].bin_error)
+            self.assertEqual(sharded['x']._n_entries, self.values.size)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestHistogramND(TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(42)
+        self.values = random_state.normal(5, 2, (10000, 2))
+        self.weights = random_state.uniform(0, 2, 10000)
+
+    def _create_hist(self):
+        return HistogramND('test', [10, 5], [(0, 10), (1, 100)], log=[False, True])
+
+    def test_fill(self):
+        hist = self._create_hist()
+        hist.fill(pd.DataFrame(self.values, columns=['x', 'y']), pd.Series(self.weights))
+
+        expected, _, _ = np.histogram2d(self.values[:, 0], self.values[:, 1], bins=hist.bins,
+                                        weights=self.weights)
+        expected_sq, _, _ = np.histogram2d(self.values[:, 0], self.values[:, 1], bins=hist.bins,
+                                           weights=self.weights**2)
+
+        np.testing.assert_allclose(hist.bin_content, expected)
+        np.testing.assert_allclose(hist.bin_error, np.sqrt(expected_sq))
+
+        array_hist = self._create_hist()
+        array_hist.fill(self.values, self.weights)
+        np.testing.assert_array_equal(hist.bin_content, array_hist.bin_content)
+
+        self.assertRaises(ValueError, hist.fill, self.values[:, :1])
+        self.assertRaises(ValueError, hist.fill, self.values, self.weights[:10])
+
+    def test_arithmetic(self):
+        hist = self._create_hist()
+        hist.fill(self.values, self.weights)
+        other = self._create_hist()
+        other.fill(self.values[::2])
+
+        hist_sum = hist + other
+        np.testing.assert_allclose(hist_sum.bin_content, hist.bin_content + other.bin_content)
+        np.testing.assert_allclose(hist_sum.bin_error, np.sqrt(hist.bin_error**2 + other.bin_error**2))
+
+        np.testing.assert_allclose((hist - other).bin_content, hist.bin_content - other.bin_content)
+        np.testing.assert_array_equal((hist - hist).bin_error, 0)
+        np.testing.assert_array_equal((-hist).bin_content, -hist.bin_content)
+
+        with np.errstate(all='raise'):
+            ratio = hist / other
+        with np.errstate(invalid='ignore', divide='ignore'):
+            expected = hist.bin_content / other.bin_content
+        np.testing.assert_allclose(ratio.bin_content, expected)
+
+        with np.errstate(all='raise'):
+            empty_ratio = self._create_hist() / self._create_hist()
+        self.assertTrue(np.isnan(empty_ratio.bin_content).all())
+        self.assertEqual(empty_ratio.project(0).underflow, 0)
+
+        self.assertEqual((hist + other)._n_entries, hist._n_entries + other._n_entries)
+        self.assertEqual((hist - other)._n_entries, hist._n_entries + other._n_entries)
+
+        self.assertRaises(ValueError, hist.__add__, HistogramND('test', [10, 5], [(0, 10), (1, 100)]))
+
+    def test_project_and_slice(self):
+        hist = self._create_hist()
+        hist.fill(self.values, self.weights)
+
+        projection = hist.project(0)
+        self.assertIsInstance(projection, Histogram)
+        np.testing.assert_allclose(projection.bin_content, hist.bin_content.sum(axis=1))
+        np.testing.assert_array_equal(projection.bins, hist.bins[0])
+        self.assertEqual(projection._n_entries, self.values.shape[0])
+
+        hist_slice = hist.slice(1, (3,))
+        self.assertIsInstance(hist_slice, Histogram)
+        np.testing.assert_array_equal(hist_slice.bin_content, hist.bin_content[3])
+        np.testing.assert_array_equal(hist_slice.bin_error, hist.bin_error[3])
+
+        hist_slice.fill(np.array([5., 5.]))
+        self.assertEqual(hist.bin_content[3, 3], hist_slice.bin_content[3])
+
+        hist_slice.bin_content = np.arange(5.)
+        hist_slice.bin_error = np.full(5, 2.)
+        np.testing.assert_array_equal(hist.bin_content[3], np.arange(5.))
+        np.testing.assert_array_equal(hist.bin_error[3], 2.)
+        np.testing.assert_array_equal(hist_slice.bin_error, 2.)
+
+
+class TestHistogramBank(TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(42)
+        self.data = pd.DataFrame(random_state.normal(5, 2, (10000, 3)), columns=['a', 'b', 'c'])
+        self.data['weight'] = random_state.uniform(0, 2, 10000)
+
+    def _create_histograms(self):
+        return {'a': Histogram('a', 20, (0, 10)),
+                'b': Histogram('b', 7, (0.1, 10), log=True),
+                'c': Histogram('c', 50, (-5, 15))}
+
+    def test_fill(self):
+        bank = HistogramBank(self._create_histograms())
+        bank.fill_from_iter((chunk, 'weight') for chunk in np.array_split(self.data, 3))
+
+        histograms = self._create_histograms()
+        for column, hist in histograms.items():
+            hist.fill(self.data[column], self.data['weight'])
+
+            np.testing.assert_array_equal(bank[column].bin_content, hist.bin_content)
+            np.testing.assert_array_equal(bank[column].bin_error, hist.bin_error)
+            self.assertEqual(bank[column].overflow, hist.overflow)
+
+        self.assertEqual(len(bank), 3)
+        self.assertTrue(bank._bin_content.flags.c_contiguous)
+
+        self.assertRaises(ValueError, bank.fill, self.data, self.data['weight'][:10])
+
+    def test_fill_unweighted(self):
+        bank = HistogramBank(self._create_histograms())
+        bank.fill(self.data)
+
+        expected, _ = np.histogram(self.data['c'], bins=50, range=(-5, 15))
+        np.testing.assert_array_equal(bank['c'].bin_content, expected)
+        np.testing.assert_array_equal(bank['c'].bin_error, np.sqrt(expected))
+
+    def test_set_row(self):
+        bank = HistogramBank(self._create_histograms())
+        bank['a'].bin_content = np.ones(20)
+        bank['a'].bin_error = np.full(20, 3.)
+
+        row = bank._columns.index('a')
+        np.testing.assert_array_equal(bank._bin_content[row, 1:21], 1.)
+        np.testing.assert_array_equal(bank._sum_weights_sq[row, 1:21], 9.)
+
+        bank.fill(self.data)
+        expected, _ = np.histogram(self.data['a'], bins=20, range=(0, 10))
+        np.testing.assert_array_equal(bank['a'].bin_content, expected + 1)
+        np.testing.assert_array_equal(bank['a'].bin_error, np.sqrt(expected + 9))
+
+
+class TestHistogramFiles(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        random_state = np.random.RandomState(42)
+        self.values = random_state.normal(5, 2, 1000)
+        self.weights = random_state.uniform(0, 2, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _create_histograms(self, values, weights):
+        histograms = {'a': Histogram('a', 20, (0, 10)), 'b': Histogram('b', 7, (0.1, 10), log=True)}
+        for hist in histograms.values():
+            hist.fill(values, weights)
+        return histograms
+
+    def test_save_and_load(self):
+        file_name = os.path.join(self.directory, 'hists.ekph')
+        histograms = self._create_histograms(self.values, self.weights)
+
+        histogram.save_histograms(file_name, histograms)
+        loaded = histogram.load_histograms(file_name)
+
+        self.assertListEqual(sorted(loaded), ['a', 'b'])
+        for name, hist in histograms.items():
+            self.assertIsInstance(loaded[name]._arrays()[0], np.memmap)
+            np.testing.assert_array_equal(loaded[name].bin_content, hist.bin_content)
+            np.testing.assert_array_equal(loaded[name].bin_error, hist.bin_error)
+            np.testing.assert_array_equal(loaded[name].bins, hist.bins)
+            self.assertEqual(loaded[name].underflow, hist.underflow)
+            self.assertEqual(loaded[name].title, hist.title)
+
+        loaded['a'].bin_content = np.ones(20)
+        np.testing.assert_array_equal(loaded['a'].bin_content, 1.)
+
+        histogram.save_histograms(file_name, {'c': histograms['a']}, append=True)
+        self.assertListEqual(list(histogram.load_histograms(file_name)), list(loaded) + ['c'])
+
+        histogram.save_histograms(file_name, histograms, append=True)
+        self.assertRaises(ValueError, histogram.load_histograms, file_name)
+
+        not_a_histogram_file = os.path.join(self.directory, 'other')
+        with open(not_a_histogram_file, 'w') as other_file:
+            other_file.write('abcdefghijklmnop')
+        self.assertRaises(IOError, histogram.load_histograms, not_a_histogram_file)
+
+    def test_merge(self):
+        file_names = []
+        for index, (values, weights) in enumerate(zip(np.array_split(self.values, 4),
+                                                      np.array_split(self.weights, 4))):
+            file_names.append(os.path.join(self.directory, 'hists_{}.ekph'.format(index)))
+            histogram.save_histograms(file_names[-1], HistogramBank(self._create_histograms(values, weights)))
+
+        output_file_name = os.path.join(self.directory, 'merged.ekph')
+        histogram.merge_histogram_files(file_names, output_file_name)
+        merged = histogram.load_histograms(output_file_name)
+
+        expected = self._create_histograms(self.values, self.weights)
+        for name, hist in expected.items():
+            np.testing.assert_allclose(merged[name].bin_content, hist.bin_content)
+            np.testing.assert_allclose(merged[name].bin_error, hist.bin_error)
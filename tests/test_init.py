@@ -0,0 +1,32 @@
+from unittest import TestCase
+import os
+import subprocess
+import sys
+
+__author__ = 'Michael Ziegler'
+
+
+class TestInit(TestCase):
+    def _run(self, statement):
+        location = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output([sys.executable, '-c', statement], cwd=location).split()
+
+    def test_lazy_imports(self):
+        loaded = self._run('import ekpytools.cli, sys\n'
+                           'print(" ".join(m for m in ("pandas", "numpy", "ROOT", "root_numpy") if m in sys.modules))')
+        self.assertListEqual(loaded, [])
+
+    def test_pandas_methods(self):
+        for statement in ('import ekpytools\nimport pandas', 'import ekpytools.statistics\nimport pandas',
+                          'import pandas\nimport ekpytools'):
+            registered = self._run(statement + '\nprint("%s %s" % (hasattr(pandas.Series, "weighted_mean"), '
+                                               'hasattr(pandas.DataFrame, "weighted_quantiles")))')
+            self.assertListEqual(registered, [b'True', b'True'])
+
+    def test_lazy_functions(self):
+        loaded = self._run('import ekpytools, sys\n'
+                           'print(" ".join(m for m in ("ekpytools.statistics", "pandas") if m in sys.modules))\n'
+                           'print(ekpytools.weighted_mean([1., 2., 4.], [1., 1., 2.]))\n'
+                           'print(ekpytools.ecdf_of_series(__import__("pandas").Series([1., 2.])).values[-1])\n'
+                           'print("ekpytools.statistics" in sys.modules)')
+        self.assertListEqual(loaded, [b'2.75', b'1.0', b'True'])
@@ -0,0 +1,212 @@
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from ekpytools import statistics
+
+__author__ = 'Michael Ziegler'
+
+
+class TestStatistics(TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(42)
+        self.values = pd.Series(random_state.gamma(2., 3., 10000))
+        self.weights = pd.Series(random_state.uniform(0, 2, 10000))
+
+    def _expected_moments(self, values, weights):
+        mean = np.sum(weights * values) / np.sum(weights)
+        central = [np.sum(weights * (values - mean)**power) / np.sum(weights) for power in (2, 3, 4)]
+        return mean, central[0], central[1] / central[0]**1.5, central[2] / central[0]**2 - 3
+
+    def test_weighted_moments(self):
+        moments = statistics.weighted_moments(self.values, self.weights, chunk_size=999)
+        expected = self._expected_moments(self.values.values, self.weights.values)
+
+        np.testing.assert_allclose([moments.mean, moments.variance, moments.skewness, moments.kurtosis],
+                                   expected, rtol=1e-10)
+
+        merged = statistics.weighted_moments(self.values[:3000], self.weights[:3000])
+        merged += statistics.weighted_moments(self.values[3000:], self.weights[3000:])
+        np.testing.assert_allclose([merged.mean, merged.variance, merged.skewness, merged.kurtosis],
+                                   expected, rtol=1e-10)
+
+        unweighted = statistics.weighted_moments(self.values)
+        self.assertAlmostEqual(unweighted.variance, self.values.var(ddof=0))
+        self.assertAlmostEqual(unweighted.skewness, self.values.skew(), places=2)
+
+        self.assertTrue(np.isnan(statistics.WeightedMoments().mean))
+
+    def test_zero_sum_weights(self):
+        values = np.array([1., 2., 6., 5., 3., 4., 0., 9.])
+        weights = np.array([1., -1., 1., -1., 2., -2., 1., 1.5])
+        expected = self._expected_moments(values, weights)
+
+        for chunk_size in (2, 3, 8):
+            moments = statistics.weighted_moments(values, weights, chunk_size=chunk_size)
+            np.testing.assert_allclose([moments.mean, moments.variance, moments.skewness, moments.kurtosis],
+                                       expected, rtol=1e-10)
+
+        zero_sum = statistics.weighted_moments(values[:6], weights[:6])
+        self.assertEqual(zero_sum.sum_weights, 0)
+        self.assertTrue(np.isnan(zero_sum.mean))
+
+        merged = statistics.weighted_moments(values[6:], weights[6:]) + zero_sum
+        np.testing.assert_allclose([merged.mean, merged.variance, merged.skewness, merged.kurtosis],
+                                   expected, rtol=1e-10)
+        merged = zero_sum + statistics.weighted_moments(values[6:], weights[6:])
+        np.testing.assert_allclose([merged.mean, merged.variance, merged.skewness, merged.kurtosis],
+                                   expected, rtol=1e-10)
+        self.assertRaises(ValueError, statistics.weighted_moments, self.values, self.weights[:10])
+
+    def test_large_offset(self):
+        values = self.values + 1e9
+        moments = statistics.weighted_moments(values, self.weights, chunk_size=1000)
+
+        self.assertAlmostEqual(moments.std, statistics.weighted_std(self.values, self.weights), places=6)
+        self.assertAlmostEqual(moments.mean - 1e9, statistics.weighted_mean(self.values, self.weights), places=4)
+
+    def test_weighted_mean_std(self):
+        self.assertAlmostEqual(statistics.weighted_mean(self.values, self.weights),
+                               np.average(self.values, weights=self.weights))
+        self.assertAlmostEqual(statistics.weighted_std(self.values, self.weights),
+                               np.sqrt(np.cov(self.values, aweights=self.weights, ddof=0)))
+        self.assertEqual(statistics.weighted_std(self.values, self.weights * 0), 0)
+        self.assertEqual(statistics.weighted_std(self.values), self.values.std())
+
+        shuffled = self.weights.sample(frac=1, random_state=1)
+        self.assertAlmostEqual(statistics.weighted_mean(self.values, shuffled),
+                               np.average(self.values, weights=self.weights))
+        self.assertAlmostEqual(statistics.weighted_std(self.values, shuffled),
+                               statistics.weighted_std(self.values, self.weights))
+
+    def test_grouped_statistics(self):
+        import ekpytools
+
+        frame = pd.DataFrame({'x': self.values, 'y': -2 * self.values + 1, 'w': self.weights,
+                              'group': self.values.astype(int) % 3})
+        frame.loc[5, 'y'] = np.nan
+
+        means = frame.weighted_mean(['x', 'y'], weight_column='w', by='group')
+        stds = frame.groupby('group').weighted_std(weight_column='w')
+        self.assertListEqual(list(stds.columns), ['x', 'y'])
+
+        for group, group_frame in frame.groupby('group'):
+            valid = group_frame.dropna()
+            self.assertAlmostEqual(means.loc[group, 'x'], statistics.weighted_mean(group_frame.x, group_frame.w))
+            self.assertAlmostEqual(means.loc[group, 'y'], statistics.weighted_mean(valid.y, valid.w))
+            self.assertAlmostEqual(stds.loc[group, 'x'], statistics.weighted_std(group_frame.x, group_frame.w))
+
+        np.testing.assert_allclose(frame.weighted_std(['x'], 'w'), [statistics.weighted_std(frame.x, frame.w)])
+
+        selected = frame.groupby('group')[['y']]
+        self.assertListEqual(list(selected.weighted_mean(weight_column='w').columns), ['y'])
+        self.assertListEqual(list(selected.weighted_std(weight_column='w').columns), ['y'])
+        self.assertListEqual(list(selected.weighted_quantiles(0.5, weight_column='w').columns), ['y'])
+        np.testing.assert_allclose(selected.weighted_mean(weight_column='w').y, means.y)
+
+    def test_unobserved_categories(self):
+        import ekpytools
+
+        frame = pd.DataFrame({'x': [1., 2., 4.], 'w': [1., 1., 2.],
+                              'group': pd.Categorical(['a', 'a', 'c'], categories=['a', 'b', 'c'])})
+        grouped = frame.groupby('group')
+
+        means = grouped.weighted_mean(weight_column='w')
+        stds = grouped.weighted_std(weight_column='w')
+        quantiles = grouped.weighted_quantiles(0.5, weight_column='w')
+
+        self.assertListEqual(list(means.index), ['a', 'b', 'c'])
+        np.testing.assert_array_equal(means.x, [1.5, np.nan, 4.])
+        np.testing.assert_array_equal(stds.x, [0.5, np.nan, 0.])
+        np.testing.assert_array_equal(quantiles.x, [1., np.nan, 4.])
+
+    def test_weighted_quantiles(self):
+        frame = pd.DataFrame({'x': self.values, 'w': self.weights, 'group': self.values.astype(int) % 3})
+
+        quantiles = frame.weighted_quantiles([0., 0.1, 0.5, 1.], ['x'], 'w')
+        cdf = statistics.ecdf_of_series(frame.x, frame.w)
+        for quantile, value in quantiles['x'].items():
+            self.assertEqual(value, cdf.index[np.searchsorted(cdf.values, quantile - 1e-12)])
+
+        grouped = frame.groupby('group').weighted_quantiles([0.25, 0.75], ['x'], 'w')
+        for group, group_frame in frame.groupby('group'):
+            expected = group_frame.weighted_quantiles([0.25, 0.75], ['x'], 'w')
+            np.testing.assert_array_equal(grouped.loc[group, 'x'].values, expected['x'].values)
+
+        unweighted = frame.weighted_quantiles(0.5, ['x'])
+        self.assertEqual(unweighted['x'].iloc[0], np.sort(self.values)[len(self.values) // 2 - 1])
+        self.assertRaises(ValueError, frame.weighted_quantiles, 1.5)
+
+    def test_ecdf(self):
+        values = pd.Series(np.round(self.values, 1), name='x')
+        values[3] = np.nan
+        weights = self.weights.copy()
+        weights[3] = 0
+
+        for cdf_weights in (None, weights):
+            cdf = statistics.ecdf_of_series(values, cdf_weights)
+
+            if cdf_weights is None:
+                counts = values.value_counts(normalize=True)
+            else:
+                counts = weights.groupby(values).sum() / weights.sum()
+            expected = counts.sort_index().cumsum()
+
+            self.assertEqual(cdf.name, 'CDF_x')
+            np.testing.assert_array_equal(cdf.index.values, expected.index.values)
+            np.testing.assert_allclose(cdf.values, expected.values)
+
+        frame = pd.DataFrame({'x': values, 'w': weights})
+        np.testing.assert_allclose(statistics.ecdf_of_column(frame, 'x', 'w').values, cdf.values)
+
+        points = np.array([-1., cdf.index[10], cdf.index[10] + 0.05, 1e3])
+        np.testing.assert_allclose(statistics.evaluate_ecdf(cdf, points), [0., cdf.iloc[10], cdf.iloc[10], 1.])
+        self.assertEqual(statistics.evaluate_ecdf(cdf, cdf.index[5]), cdf.iloc[5])
+
+        quantiles = statistics.inverse_ecdf(cdf, [0., cdf.iloc[10], cdf.iloc[10] + 1e-9, 1.])
+        np.testing.assert_array_equal(quantiles, cdf.index.values[[0, 10, 11, -1]])
+
+    def test_binned_ecdf(self):
+        cdf = statistics.ecdf_of_series(self.values, self.weights)
+        binned = statistics.ecdf_of_series(self.values, self.weights, bins=200)
+
+        self.assertEqual(len(binned), 201)
+        self.assertEqual(binned.iloc[-1], 1.)
+        self.assertEqual(binned.index[0], self.values.min())
+
+        points = np.linspace(0, 30, 50)
+        np.testing.assert_allclose(statistics.evaluate_ecdf(binned, points, interpolate=True),
+                                   statistics.evaluate_ecdf(cdf, points), atol=5e-3)
+        np.testing.assert_allclose(statistics.inverse_ecdf(binned, [0.1, 0.5, 0.9], interpolate=True),
+                                   statistics.inverse_ecdf(cdf, [0.1, 0.5, 0.9]), atol=0.2)
+
+        limited = statistics.ecdf_of_series(self.values, bins=10, x_limits=(5, 10))
+        self.assertAlmostEqual(limited.iloc[0], (self.values < 5).mean())
+        self.assertAlmostEqual(limited.iloc[-1], (self.values <= 10).mean())
+
+    def test_quantile_sketch(self):
+        cdf = statistics.ecdf_of_series(self.values, self.weights)
+        points = np.linspace(0, 30, 200)
+        quantiles = np.linspace(0.01, 0.99, 99)
+
+        sketch = statistics.QuantileSketch(compression=100, buffer_size=1000)
+        for chunk in range(0, len(self.values), 700):
+            sketch.update(self.values[chunk:chunk + 700], self.weights[chunk:chunk + 700])
+
+        self.assertLessEqual(len(sketch), 51)
+        self.assertAlmostEqual(sketch.sum_weights, self.weights.sum())
+        self.assertLess(np.abs(sketch.cdf(points) - statistics.evaluate_ecdf(cdf, points)).max(), 0.01)
+        self.assertLess(np.abs(statistics.evaluate_ecdf(cdf, sketch.quantile(quantiles)) - quantiles).max(), 0.01)
+        self.assertEqual(sketch.quantile(0.), self.values.min())
+        self.assertEqual(sketch.cdf(self.values.max()), 1.)
+
+        merged = (statistics.QuantileSketch(100).update(self.values[:4000], self.weights[:4000]) +
+                  statistics.QuantileSketch(100).update(self.values[4000:], self.weights[4000:]))
+        self.assertLess(np.abs(merged.cdf(points) - statistics.evaluate_ecdf(cdf, points)).max(), 0.01)
+        np.testing.assert_allclose(statistics.evaluate_ecdf(merged.ecdf(), points, interpolate=True),
+                                   merged.cdf(points))
+
+        accurate = statistics.QuantileSketch(compression=1000).update(self.values, self.weights)
+        self.assertLess(np.abs(accurate.cdf(points) - statistics.evaluate_ecdf(cdf, points)).max(), 0.002)
+
+        self.assertRaises(ValueError, sketch.update, self.values, -self.weights)
+        self.assertTrue(np.isnan(statistics.QuantileSketch().quantile(0.5)))
@@ -0,0 +1,139 @@
+from unittest import TestCase, skipIf
+from distutils.spawn import find_executable
+import os
+import shutil
+import tempfile
+from ekpytools import _transfer
+
+__author__ = 'Michael Ziegler'
+
+
+class TestTransfer(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dest = os.path.join(self.directory, 'dest')
+        os.mkdir(self.dest)
+
+        self.sources = []
+        for index, size in enumerate([10, 5000, 20, 3000, 0, 7]):
+            self.sources.append(os.path.join(self.directory, 'file_{}.txt'.format(index)))
+            with open(self.sources[-1], 'w') as source_file:
+                source_file.write('x' * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_plan_batches(self):
+        files = [('a', 100), ('b', 1), ('c', 50), ('d', 49), ('e', 2), ('f', 1)]
+
+        batches = _transfer._plan_batches(files, 2, batch_size=4)
+        self.assertListEqual(batches, [['a', 'b', 'f'], ['c', 'd', 'e']])
+
+        batches = _transfer._plan_batches(files, 1, batch_size=2)
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+        self.assertListEqual(sorted(sum(batches, [])), list('abcdef'))
+
+    def test_split_source(self):
+        self.assertEqual(_transfer._split_source('/data/file.root'), ('/', 'data/file.root'))
+        self.assertEqual(_transfer._split_source('data/file.root'), ('', 'data/file.root'))
+        self.assertEqual(_transfer._split_source('user@host:/data/file.root'), ('user@host:/', 'data/file.root'))
+        self.assertEqual(_transfer._split_source('./a:b/file.root'), ('', './a:b/file.root'))
+
+    def test_failed_copy(self):
+        results = _transfer.parallel_rsync(self.sources + [os.path.join(self.directory, 'missing')], self.dest,
+                                           n=2, batch_size=3, retries=1, retry_delay=0.)
+
+        self.assertListEqual([result.source for result in results][:-1], self.sources)
+        self.assertFalse(results[-1].success)
+        self.assertEqual(results[-1].attempts, 3)
+
+    @skipIf(find_executable('rsync') is None, 'rsync is not installed')
+    def test_parallel_rsync(self):
+        results = _transfer.parallel_rsync(self.sources, self.dest, n=2, batch_size=2)
+
+        self.assertTrue(all(result.success for result in results))
+        self.assertListEqual(sorted(os.listdir(self.dest)), sorted(map(os.path.basename, self.sources)))
+
+    def test_journal(self):
+        journal_file = os.path.join(self.directory, 'journal.txt')
+        journal = _transfer.TransferJournal(journal_file)
+        journal.add(self.sources[:4])
+
+        journal = _transfer.TransferJournal(journal_file)
+        self.assertEqual(len(journal), 4)
+        journal.add(self.sources[2:])
+        self.assertEqual(len(open(journal_file).readlines()), len(self.sources))
+
+        results = _transfer.parallel_rsync(self.sources, self.dest, journal=journal)
+        self.assertTrue(all(result.success and result.attempts == 0 for result in results))
+
+    def test_progress(self):
+        reports = []
+        progress = _transfer.TransferProgress(4, 4000, report=reports.append, interval=3600.)
+        self.assertIsNone(progress.eta)
+
+        progress([_transfer.TransferResult('a', True, 0, 1)], 1000)
+        progress([_transfer.TransferResult('b', False, 23, 3)] * 2, 2000)
+        self.assertEqual(len(reports), 1)
+        self.assertEqual((progress.files, progress.bytes, progress.failed), (3, 3000, 2))
+        self.assertAlmostEqual(progress.eta, progress.elapsed / 3, places=2)
+
+        progress([_transfer.TransferResult('c', True, 0, 1)], 1000)
+        self.assertEqual(len(reports), 2)
+        self.assertIn('4/4 files', str(progress))
+        self.assertEqual(_transfer.format_bytes(1536 * 1024), '1.5 MiB')
+
+    def test_parallel_copy(self):
+        missing = os.path.join(self.directory, 'missing')
+        results = _transfer.parallel_copy(self.sources + [missing], self.dest, n=3, retries=0)
+
+        self.assertTrue(all(result.success for result in results[:-1]))
+        self.assertFalse(results[-1].success)
+        self.assertListEqual(sorted(os.listdir(self.dest)), sorted(map(os.path.basename, self.sources)))
+
+        for source in self.sources:
+            target = os.path.join(self.dest, os.path.basename(source))
+            self.assertEqual(open(target).read(), open(source).read())
+            self.assertEqual(int(os.path.getmtime(target)), int(os.path.getmtime(source)))
+
+        target = os.path.join(self.dest, os.path.basename(self.sources[1]))
+        with open(target, 'w') as target_file:
+            target_file.write('y' * 5000)
+        os.utime(target, (os.path.getatime(self.sources[1]), os.path.getmtime(self.sources[1])))
+
+        _transfer.parallel_copy(self.sources, self.dest)
+        self.assertEqual(open(target).read(), 'y' * 5000)
+
+    def test_given_sizes(self):
+        sizes = _transfer.stat_sources(self.sources)
+        self.assertListEqual(sizes, [10, 5000, 20, 3000, 0, 7])
+
+        copied_sizes = []
+        results = _transfer.parallel_copy(self.sources, self.dest, sizes=[2 * size for size in sizes],
+                                          callback=lambda results, size: copied_sizes.append(size))
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(sum(copied_sizes), 2 * sum(sizes))
+
+        self.assertRaises(ValueError, _transfer.parallel_copy, self.sources, self.dest, sizes=sizes[:2])
+
+    @skipIf(not _transfer.sys.platform.startswith('linux'), 'sendfile is only used on Linux')
+    def test_sendfile(self):
+        sendfile = _transfer._get_sendfile()
+        self.assertIsNotNone(sendfile)
+
+        data = os.urandom(3 * 1024**2 + 17)
+        with open(self.sources[0], 'wb') as source_file:
+            source_file.write(data)
+
+        target = os.path.join(self.dest, 'copy')
+        with open(self.sources[0], 'rb') as source_file:
+            with open(target, 'wb') as target_file:
+                self.assertEqual(sendfile(target_file.fileno(), source_file.fileno(), 5, 10), 10)
+        self.assertTrue(open(target, 'rb').read() == data[5:15])
+
+        with open(self.sources[0], 'rb') as source_file:
+            with open(target, 'wb') as target_file:
+                _transfer._copy_data(source_file, target_file, len(data))
+        self.assertTrue(open(target, 'rb').read() == data)
+        self.assertRaises(OSError, sendfile, -1, -1, 0, 10)